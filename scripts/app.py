@@ -1,147 +1,234 @@
+import datetime
+import os
+
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import requests
-import zipfile
-import csv
-import os
 import numpy as np
 
-st.set_page_config(layout="wide", page_title="Lotto Predictor", page_icon="🎡")
+from lotto import (
+    HALF_LIVES, MAX_LAG, DatasetRegistry, RefreshJob, current_delays, ensure_dirs, pattern_summary, rank_numbers,
+    randomness_report, run_backtests, sweep, WheelViews,
+)
+from lotto.charts import ChartCache, delay_chart, delay_history_chart, distribution_chart, frequency_chart
+from lotto.metrics import METRICS, profile_call
+from lotto.render import GRID_COLORS, HEAT_COLORS, draw_balls, heat_colors, heat_grid, html_table, number_grid
 
-os.makedirs('data/raw', exist_ok=True)
-os.makedirs('data/processed', exist_ok=True)
-os.makedirs('data/historical_stats', exist_ok=True)
+@st.cache_resource(show_spinner=False)
+def load_registry():
+    # One registry per server process; every session reads the same
+    # immutable Dataset from it instead of its own copy.
+    ensure_dirs()
+    return DatasetRegistry()
 
-@st.cache_data
-def load_data():
-    try:
-        lotto_data = pd.read_csv('data/processed/lotto_historical.csv')
-    except (FileNotFoundError, pd.errors.EmptyDataError):
-        lotto_data = pd.DataFrame(columns=['date', 'wheel', 'n1', 'n2', 'n3', 'n4', 'n5'])
-    
-    try:
-        most_frequent = pd.read_csv('data/historical_stats/most_frequent.csv')
-    except (FileNotFoundError, pd.errors.EmptyDataError):
-        most_frequent = pd.DataFrame(columns=['wheel', 'number', 'frequency'])
-    
-    try:
-        least_frequent = pd.read_csv('data/historical_stats/least_frequent.csv')
-    except (FileNotFoundError, pd.errors.EmptyDataError):
-        least_frequent = pd.DataFrame(columns=['wheel', 'number', 'frequency'])
-    
-    try:
-        frequencies = pd.read_csv('data/historical_stats/numbers_frequency.csv')
-    except (FileNotFoundError, pd.errors.EmptyDataError):
-        frequencies = pd.DataFrame(columns=['wheel', 'number', 'frequency'])
-    
-    return lotto_data, most_frequent, least_frequent, frequencies
+@st.cache_resource(show_spinner=False)
+def load_chart_cache():
+    return ChartCache()
 
-lotto_data, most_frequent, least_frequent, frequencies = load_data()
+def load_state(dataset):
+    return (
+        dataset.recent, dataset.most_frequent, dataset.least_frequent, dataset.frequencies, dataset.version,
+        dataset.presence, dataset.count_cube, dataset.cooccurrence,
+    )
 
-if not lotto_data.empty:
-    lotto_data['date'] = pd.to_datetime(lotto_data['date'])
+def combination_table(combinations, counts, title, color):
+    table = pd.DataFrame({title: [' - '.join(str(n) for n in numbers) for numbers in combinations], 'Frequency': counts})
+    return html_table(table, color)
 
-def calculate_frequencies():
-    last_100_extractions = lotto_data.groupby('wheel').tail(100)
-    calculated_frequencies = last_100_extractions.melt(
-        id_vars=['wheel'], 
-        value_vars=['n1', 'n2', 'n3', 'n4', 'n5'],
-        var_name='num_pos', 
-        value_name='number'
-    ).groupby(['wheel', 'number']).size().reset_index(name='frequency')
-    
-    calculated_most_frequent = calculated_frequencies.groupby('wheel').apply(
-        lambda x: x.nlargest(10, 'frequency')
-    ).reset_index(drop=True)
-    
-    calculated_least_frequent = calculated_frequencies.groupby('wheel').apply(
-        lambda x: x.nsmallest(10, 'frequency')
-    ).reset_index(drop=True)
-    
-    calculated_most_frequent.to_csv('data/historical_stats/most_frequent.csv', index=False)
-    calculated_least_frequent.to_csv('data/historical_stats/least_frequent.csv', index=False)
-    calculated_frequencies.to_csv('data/historical_stats/numbers_frequency.csv', index=False)
-    
-    return calculated_frequencies, calculated_most_frequent, calculated_least_frequent
+# Rendered HTML is memoized by dataset version plus whatever selects the
+# data (wheel, window, date), so reruns that change nothing relevant reuse it.
 
-def calculate_delays():
-    today = pd.Timestamp.now().floor('D')
-    delays = {}
-    
-    for wheel in lotto_data['wheel'].unique():
-        wheel_data = lotto_data[lotto_data['wheel'] == wheel].sort_values('date', ascending=False)
-        wheel_delays = {}
-        
-        for number in range(1, 91):
-            for _, row in wheel_data.iterrows():
-                if number in [row['n1'], row['n2'], row['n3'], row['n4'], row['n5']]:
-                    last_date = row['date']
-                    days_since = (today - last_date).days
-                    wheel_delays[number] = days_since
-                    break
-            else:
-                wheel_delays[number] = 999
-        
-        delays[wheel] = wheel_delays
-    
-    return delays
+@st.cache_data(show_spinner=False, max_entries=256)
+def render_draws_table(version, date, _dataset):
+    draws = _dataset.draws(date, date)
+    table = pd.DataFrame({'Wheel': draws['wheel'].astype(str).to_numpy()})
+    for i, column in enumerate(['n1', 'n2', 'n3', 'n4', 'n5'], start=1):
+        table[f'Number {i}'] = draws[column].to_numpy()
+    return html_table(table, width='80%', centered=True, label_column=True) if len(table) else None
 
-def refresh_data():
-    URL = "https://www.igt.it/STORICO_ESTRAZIONI_LOTTO/storico01-oggi.zip"
-    response = requests.get(URL)
-    with open("data/raw/lotto_historical.zip", "wb") as f:
-        f.write(response.content)
+@st.cache_data(show_spinner=False, max_entries=256)
+def render_frequency_tables(version, wheel, window, _counts):
+    most_numbers, most_counts = rank_numbers(_counts, k=5, largest=True)
+    least_numbers, least_counts = rank_numbers(_counts, k=5, largest=False)
+    return (
+        html_table(pd.DataFrame({'Number': most_numbers, 'Frequency': most_counts}), '#1e88e5'),
+        html_table(pd.DataFrame({'Number': least_numbers, 'Frequency': least_counts}), '#f44336'),
+    )
 
-    with zipfile.ZipFile("data/raw/lotto_historical.zip", 'r') as zip_ref:
-        zip_ref.extractall("data/raw/")
-    
-    input_file = "data/raw/storico01-oggi.txt"
-    output_file = "data/processed/lotto_historical.csv"
+@st.cache_data(show_spinner=False, max_entries=256)
+def render_last_draws(version, wheel, window, count, _draws, _most_frequent, _least_frequent):
+    draws = _draws.tail(wheel, count).iloc[::-1]
+    return draw_balls(draws, _most_frequent, _least_frequent) if len(draws) else None
 
-    with open(input_file, "r") as txt_file, open(output_file, "w", newline='') as csv_file:
-        csv_writer = csv.writer(csv_file)
-        csv_writer.writerow(["date", "wheel", "n1", "n2", "n3", "n4", "n5"])
-        
-        for line in txt_file:
-            parts = line.strip().split("\t")
-            if parts[1] == "NA":
-                parts[1] = "NAPOLI"
-            elif parts[1] == "BA":
-                parts[1] = "BARI"
-            elif parts[1] == "CA":
-                parts[1] = "CAGLIARI"
-            elif parts[1] == "FI":
-                parts[1] = "FIRENZE"
-            elif parts[1] == "GE":
-                parts[1] = "GENOVA"
-            elif parts[1] == "MI":
-                parts[1] = "MILANO"
-            elif parts[1] == "PA":
-                parts[1] = "PALERMO"
-            elif parts[1] == "RM":
-                parts[1] = "ROMA"
-            elif parts[1] == "TO":
-                parts[1] = "TORINO"
-            elif parts[1] == "VE":
-                parts[1] = "VENEZIA"
-            elif parts[1] == "RN":
-                parts[1] = "NAZIONALE"
-            csv_writer.writerow(parts)
-    
-    global lotto_data, most_frequent, least_frequent, frequencies
-    lotto_data = pd.read_csv('data/processed/lotto_historical.csv')
-    lotto_data['date'] = pd.to_datetime(lotto_data['date'])
-    
-    frequencies, most_frequent, least_frequent = calculate_frequencies()
-    
-    st.cache_data.clear()
+@st.cache_data(show_spinner=False, max_entries=256)
+def render_number_grid(version, wheel, window, _presence, _most_frequent, _least_frequent):
+    grid_numbers = np.arange(1, 91)
+    top_10_frequent = _most_frequent[wheel].head(10)['number'].to_numpy(dtype=int)
+    bottom_10_frequent = _least_frequent[wheel].head(10)['number'].to_numpy(dtype=int)
+    return number_grid(
+        _presence.recent(wheel, window),
+        np.isin(grid_numbers, top_10_frequent),
+        np.isin(grid_numbers, bottom_10_frequent),
+    )
 
-def main():
+@st.cache_data(show_spinner=False, max_entries=256)
+def render_heat_grid(version, wheel, half_life, _heat):
+    return heat_grid(_heat.scores_for(wheel, half_life))
+
+def heat_legend(half_life):
+    # The colour scale of heat_colors, with what a half-life means.
+    return (
+        "<div style='text-align: center; margin-bottom: 10px;'>"
+        f"<div style='height: 14px; width: 60%; margin: 0 auto 5px auto; border-radius: 4px; background: linear-gradient(to right, {', '.join(HEAT_COLORS)});'></div>"
+        f"Cold &larr; wheel average &rarr; Hot. Heat counts every appearance, halving its weight every {half_life} draws."
+        "</div>"
+    )
+
+def select_heat(label, key):
+    # A colouring choice; returns the heat half-life in draws, or None for
+    # the default colouring.
+    colouring = st.radio(label, ["Frequency", "Heat"], horizontal=True, key=key)
+    if colouring != "Heat":
+        return None
+    return st.select_slider("Heat half-life (draws)", options=list(HALF_LIVES), value=25, key=f"{key}_half_life")
+
+# Results keyed by dataset version keep only a few entries, so versions
+# replaced by a refresh age out instead of being cleared for everyone.
+# Per-wheel tables come back as WheelViews, so picking a wheel is a slice.
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def calculate_delays(version, today, _presence):
+    with METRICS.timer('lotto_stage_seconds', stage='delays'):
+        return WheelViews(current_delays(_presence, today))
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def calculate_backtests(version, wheel, _presence):
+    with METRICS.timer('lotto_stage_seconds', stage='backtests'):
+        return run_backtests(sweep([wheel]), presence=_presence)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def calculate_randomness(version, _presence):
+    with METRICS.timer('lotto_stage_seconds', stage='randomness'):
+        return WheelViews(randomness_report(_presence))
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def render_delay_tables(version, wheel, today, _presence):
+    wheel_delays = calculate_delays(version, today, _presence)[wheel]
+    delay_df = pd.DataFrame({
+        'Number': wheel_delays['number'].array,
+        'Delay (days)': wheel_delays['delay_days'].array,
+        'Delay (draws)': wheel_delays['delay_draws'].array
+    }).sort_values('Delay (days)', ascending=False, na_position='first')
+    # The chart's input comes along, so the frame is built only here.
+    drawn_delays = delay_df.dropna(subset=['Delay (days)'])
+    return (
+        html_table(delay_df.head(10), '#f44336', missing_label='Never drawn'),
+        html_table(delay_df.tail(10).sort_values('Delay (days)'), '#4caf50', missing_label='Never drawn'),
+        drawn_delays['Number'].to_numpy(), drawn_delays['Delay (days)'].to_numpy(dtype=float),
+    )
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def render_delay_history_table(version, wheel, _dataset):
+    statistics = _dataset.by_wheel('delay_statistics')[wheel]
+    closest_to_record = statistics.sort_values('current_vs_max', ascending=False, kind='stable').head(10)
+    return html_table(pd.DataFrame({
+        'Number': closest_to_record['number'].array,
+        'Current delay': closest_to_record['current_delay'].array,
+        'Max delay': closest_to_record['max_delay'].array,
+        'Mean delay': closest_to_record['mean_delay'].map('{:.1f}'.format).array,
+        '90th percentile': closest_to_record['p90_delay'].map('{:.0f}'.format).array,
+        'Longer than % of past gaps': closest_to_record['current_percentile'].map('{:.1f}%'.format).array,
+    }), '#9c27b0')
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def render_randomness_table(version, wheel, _presence):
+    wheel_randomness = calculate_randomness(version, _presence)[wheel]
+    statistic_names = {
+        'frequency_chi2': 'Frequency chi-square (whole history)',
+        'odd_even_chi2': 'Odd/even chi-square (whole history)',
+        'max_delay': 'Longest current delay (draws)',
+        'window_max': 'Highest frequency (last 100 draws)',
+        'window_top': '10th highest frequency (last 100 draws)',
+        'window_min': 'Lowest frequency (last 100 draws)',
+    }
+    return html_table(pd.DataFrame({
+        'Statistic': wheel_randomness['statistic'].map(statistic_names).array,
+        'Observed': wheel_randomness['observed'].map('{:g}'.format).array,
+        'Random draws (95% range)': (
+            wheel_randomness['null_low'].map('{:.4g}'.format) + ' - ' + wheel_randomness['null_high'].map('{:.4g}'.format)
+        ).array,
+        'p-value': wheel_randomness['p_value'].map('{:.3f}'.format).array,
+    }), '#9c27b0', width='80%', centered=True)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def render_backtest_table(version, wheel, k, _presence):
+    backtests = calculate_backtests(version, wheel, _presence)
+    results = backtests[backtests['k'] == k]
+    strategy_names = {'hot': 'Most frequent', 'cold': 'Least frequent', 'delay': 'Longest delay'}
+    return html_table(pd.DataFrame({
+        'Strategy': results['strategy'].map(strategy_names).array,
+        'Window (draws)': results['window'].astype(object).fillna('All').array,
+        'Mean hits': results['mean_hits'].map('{:.3f}'.format).array,
+        'vs chance': results['lift'].map('{:.2f}x'.format).array,
+        'At least 1': results['hit_rate'].map('{:.1%}'.format).array,
+        'Ambo': results['ambo_rate'].map('{:.2%}'.format).array,
+        'Terno': results['terno_rate'].map('{:.3%}'.format).array,
+    }), '#1e88e5', width='80%', centered=True)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def render_followers_table(version, wheel, number, k, target_wheel, exact, top, _transitions):
+    followers = _transitions.followers(wheel, number, k, target_wheel, top, exact)
+    return html_table(pd.DataFrame({
+        'Number': followers['number'].array,
+        'Times': followers['count'].array,
+        'Share of draws': followers['rate'].map('{:.1%}'.format).array,
+        'Usual share': followers['base_rate'].map('{:.1%}'.format).array,
+        'vs usual': followers['lift'].map('{:.2f}x'.format).array,
+    }), '#ff9800', width='80%', centered=True), followers.attrs['occurrences']
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_server(port):
+    # Optional Prometheus scrape endpoint, one per server process.
+    return METRICS.serve(port)
+
+@st.cache_resource(show_spinner=False)
+def load_refresh_job():
+    # Shared by all sessions, so concurrent clicks join the same refresh.
+    return RefreshJob()
+
+REFRESH_PHASES = {
+    'starting': "Starting",
+    'download': "Downloading the archive",
+    'parse': "Reading new draws",
+    'stats': "Updating statistics",
+    'done': "Finishing",
+}
+
+@st.fragment(run_every=1)
+def show_refresh_progress(job):
+    # Polls the background refresh; once it is over, the whole page reruns
+    # and the registry hands out the new Dataset.
+    status = job.status()
+    if status['state'] != 'running':
+        st.rerun()
+    phase = REFRESH_PHASES.get(status['phase'], status['phase'])
+    st.progress(status['progress'] or 0.0, text=f"{phase}...")
+
+def select_draw_date(date):
+    st.session_state['draw_year'] = date.year
+    st.session_state['draw_month'] = date.month
+    st.session_state['draw_day'] = date.day
+
+def show_page():
+    st.set_page_config(layout="wide", page_title="Lotto Predictor", page_icon="🎡")
+    registry = load_registry()
+    dataset = registry.current()
+    recent_draws, most_frequent, least_frequent, frequencies, lotto_version, presence, count_cube, cooccurrence = load_state(dataset)
+    chart_cache = load_chart_cache()
+    
     st.markdown("<h1 style='text-align: center;'>Lotto Draws Visualizer</h1>", unsafe_allow_html=True)
 
-    if not lotto_data.empty:
-        last_update_date = lotto_data['date'].max().strftime('%B %d, %Y')
+    if not recent_draws.empty:
+        last_update_date = recent_draws['date'].max().strftime('%B %d, %Y')
         
         st.markdown(
             f"<div style='text-align: center; padding: 10px; background-color: #1e88e5; color: white; border-radius: 5px; margin-bottom: 20px;'>"
@@ -152,135 +239,155 @@ def main():
     
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
+        refresh_job = load_refresh_job()
         if st.button('Refresh Data', key="refresh_button", use_container_width=True, type="primary"):
-            refresh_data()
-            st.success("Data refreshed successfully!")
+            refresh_job.start()
+            st.session_state['refresh_run'] = refresh_job.status()['run']
+        
+        refresh_status = refresh_job.status()
+        if refresh_status['state'] == 'running':
+            show_refresh_progress(refresh_job)
+        elif refresh_status['run'] == st.session_state.get('refresh_run'):
+            if refresh_status['state'] == 'failed':
+                st.error(f"Refresh failed: {refresh_status['error']}")
+            elif refresh_status['new_draws']:
+                st.success(f"Data refreshed successfully! {refresh_status['new_draws']} new draws added.")
+            else:
+                st.info("Data is already up to date.")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["Draws by Date", "Frequency Analysis", "Number Grid", "Delays Analysis"])    
-    with tab1:
-        if lotto_data.empty:
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["Draws by Date", "Frequency Analysis", "Number Grid", "Delays Analysis", "Ambi & Terni", "Backtest", "Spy Numbers"])    
+    with tab1, METRICS.timer('lotto_stage_seconds', stage='tab_draws'):
+        if recent_draws.empty:
             st.warning("No data available. Please refresh the data.")
         else:
             st.markdown("<h3 style='text-align: center;'>View Draws by Date</h3>", unsafe_allow_html=True)
             
-            available_dates = lotto_data['date'].dt.date.unique()
-            available_years = sorted(list({date.year for date in available_dates}))
-            available_months = sorted(list({date.month for date in available_dates}))
-            available_days = sorted(list({date.day for date in available_dates}))
-            
-            last_date = available_dates[-1]
-            default_year = last_date.year
-            default_month = last_date.month
-            default_day = last_date.day
-            
+            # Year, then month, then day: each list only holds dates with a
+            # draw, and a choice the new year or month lacks falls back to
+            # its latest one.
+            date_index = dataset.date_index
+            last_date = date_index.last()
+            if 'draw_year' not in st.session_state:
+                select_draw_date(last_date)
+
+            years = date_index.years().tolist()
+            if st.session_state['draw_year'] not in years:
+                st.session_state['draw_year'] = years[-1]
+            months = date_index.months(st.session_state['draw_year']).tolist()
+            if st.session_state.get('draw_month') not in months:
+                st.session_state['draw_month'] = months[-1]
+            days = date_index.days(st.session_state['draw_year'], st.session_state['draw_month']).tolist()
+            if st.session_state.get('draw_day') not in days:
+                st.session_state['draw_day'] = days[-1]
+
             col1, col2, col3 = st.columns(3)
 
             with col1:
-                selected_day = st.selectbox('Select Day', available_days, index=available_days.index(default_day))
+                selected_day = st.selectbox('Select Day', days, key='draw_day')
             
             with col2:
-                selected_month = st.selectbox('Select Month', available_months, index=available_months.index(default_month))
+                selected_month = st.selectbox('Select Month', months, key='draw_month')
             
             with col3:
-                selected_year = st.selectbox('Select Year', available_years, index=available_years.index(default_year))
+                selected_year = st.selectbox('Select Year', years, key='draw_year')
                 
-            selected_date = pd.to_datetime(f"{selected_year}/{selected_month}/{selected_day}").date()
-            filtered_data = lotto_data[lotto_data['date'].dt.date == selected_date]
+            selected_date = datetime.date(selected_year, selected_month, selected_day)
+            previous_date = date_index.previous(selected_date)
+            next_date = date_index.next(selected_date)
+
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                st.button("← Previous draw", disabled=previous_date is None, on_click=select_draw_date, args=(previous_date,), use_container_width=True)
+            with col3:
+                st.button("Next draw →", disabled=next_date is None, on_click=select_draw_date, args=(next_date,), use_container_width=True)
+
+            draws_table = render_draws_table(lotto_version, selected_date, dataset)
             
-            if not filtered_data.empty:
+            if draws_table is not None:
                 st.markdown("<h4 style='text-align: center;'>Numbers drawn on {}</h4>".format(selected_date), unsafe_allow_html=True)
-                
-                table_html = "<table style='width: 80%; margin: 0 auto; border-collapse: collapse;'>"
-                table_html += "<tr><th style='border: 1px solid #ddd; padding: 8px; text-align: left;'>Wheel</th>"
-                
-                for i in range(1, 6):
-                    table_html += f"<th style='border: 1px solid #ddd; padding: 8px; text-align: center;'>Number {i}</th>"
-                table_html += "</tr>"
-                
-                for _, wheel_data in filtered_data.iterrows():
-                    table_html += f"<tr><td style='border: 1px solid #ddd; padding: 8px; font-weight: bold;'>{wheel_data['wheel']}</td>"
-                    
-                    for col in ['n1', 'n2', 'n3', 'n4', 'n5']:
-                        if pd.notna(wheel_data[col]):
-                            table_html += f"<td style='border: 1px solid #ddd; padding: 8px; text-align: center;'>{wheel_data[col]}</td>"
-                        else:
-                            table_html += f"<td style='border: 1px solid #ddd; padding: 8px; text-align: center;'>-</td>"
-                    
-                    table_html += "</tr>"
-                
-                table_html += "</table>"
-                st.markdown(table_html, unsafe_allow_html=True)
+                st.markdown(draws_table, unsafe_allow_html=True)
             else:
                 st.warning("No draws found for the selected date.")
     
-    with tab2:
-        if most_frequent.empty or least_frequent.empty:
+    with tab2, METRICS.timer('lotto_stage_seconds', stage='tab_frequency'):
+        if recent_draws.empty:
             st.warning("No frequency data available. Please refresh the data.")
         else:
             st.markdown("<h3 style='text-align: center;'>Number Frequency Analysis</h3>", unsafe_allow_html=True)
             
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
-                wheels = most_frequent['wheel'].unique()
+                wheels = dataset.wheels
                 selected_wheel = st.selectbox("Select Wheel", wheels, key="freq_wheel_select")
+                
+                window_mode = st.radio("Frequency window", ["Last draws", "Date range"], horizontal=True, key="freq_window_mode")
+                wheel_draw_count = count_cube.draw_count(selected_wheel)
+                if window_mode == "Last draws":
+                    window_draws = st.slider(
+                        "Number of draws to count",
+                        min_value=1,
+                        max_value=wheel_draw_count,
+                        value=min(100, wheel_draw_count),
+                        key="freq_window_slider"
+                    )
+                    all_frequencies, window_total = count_cube.window(selected_wheel, window_draws)
+                    frequency_window = window_draws
+                else:
+                    first_date = count_cube.window_start(selected_wheel, wheel_draw_count).item()
+                    last_date = count_cube.dates[-1].item()
+                    date_range = st.date_input(
+                        "Draw dates",
+                        value=(count_cube.window_start(selected_wheel, 100).item(), last_date),
+                        min_value=first_date,
+                        max_value=last_date,
+                        key="freq_date_range"
+                    )
+                    if not date_range:
+                        # Cleared: count the whole history rather than nothing.
+                        st.info("No dates selected: counting every draw.")
+                        date_range = (first_date, last_date)
+                    range_start, range_end = date_range if len(date_range) == 2 else (date_range[0], date_range[0])
+                    all_frequencies, window_total = count_cube.between(selected_wheel, range_start, range_end)
+                    frequency_window = (range_start, range_end)
+                
+                freq_half_life = select_heat("Colour bars by", "freq_colouring")
             
             st.markdown(f"<h4 style='text-align: center;'>Frequency Histogram for {selected_wheel}</h4>", unsafe_allow_html=True)
-            
-            wheel_frequencies = frequencies[frequencies['wheel'] == selected_wheel]
-            freq_dict = dict(zip(wheel_frequencies['number'], wheel_frequencies['frequency']))
+            st.markdown(f"<div style='text-align: center;'>Counting {window_total} draws</div>", unsafe_allow_html=True)
             
             all_numbers = range(1, 91)
-            all_frequencies = [freq_dict.get(num, 0) for num in all_numbers]
+            most_freq_nums, most_freq_counts = rank_numbers(all_frequencies, largest=True)
+            least_freq_nums, least_freq_counts = rank_numbers(all_frequencies, largest=False)
+            is_most_frequent = np.isin(all_numbers, most_freq_nums)
+            is_least_frequent = np.isin(all_numbers, least_freq_nums) & ~is_most_frequent
             
-            fig, ax = plt.subplots(figsize=(12, 6))
-            bars = ax.bar(all_numbers, all_frequencies, color='#1e88e5')
-            
-            for i, freq in enumerate(all_frequencies):
-                if i+1 in most_frequent[most_frequent['wheel'] == selected_wheel]['number'].tolist():
-                    bars[i].set_color('#4caf50')
-                elif i+1 in least_frequent[least_frequent['wheel'] == selected_wheel]['number'].tolist():
-                    bars[i].set_color('#f44336')
-            
-            ax.set_xlabel('Number')
-            ax.set_ylabel('Frequency')
-            ax.set_title(f'Number Frequency for Wheel {selected_wheel}')
-            ax.set_xticks(range(1, 91, 5))
-            ax.grid(axis='y', linestyle='--', alpha=0.7)
+            bar_colors = None
+            if freq_half_life is not None:
+                bar_colors = heat_colors(dataset.heat.scores_for(selected_wheel, freq_half_life))
+                st.markdown(heat_legend(freq_half_life), unsafe_allow_html=True)
             
             col1, col2, col3 = st.columns([1, 10, 1])
             with col2:
-                st.pyplot(fig)
+                st.image(chart_cache.render(
+                    ('frequency', selected_wheel, frequency_window, freq_half_life, lotto_version),
+                    frequency_chart, all_frequencies, is_most_frequent, is_least_frequent, selected_wheel, bar_colors
+                ))
+            
+            st.markdown("<h4 style='text-align: center;'>Randomness Check</h4>", unsafe_allow_html=True)
             
+            randomness_table = render_randomness_table(lotto_version, selected_wheel, presence)
+            st.markdown("<div style='text-align: center; margin-bottom: 10px;'>Compared with simulated histories of uniformly random draws; a small p-value means the wheel is unusual for pure chance</div>", unsafe_allow_html=True)
+            st.markdown(randomness_table, unsafe_allow_html=True)
+            
+            most_table, least_table = render_frequency_tables(lotto_version, selected_wheel, frequency_window, all_frequencies)
             col1, col2 = st.columns(2)
             
             with col1:
                 st.markdown("<h4 style='text-align: center;'>Most Frequent Numbers</h4>", unsafe_allow_html=True)
-                most_wheel_data = most_frequent[most_frequent['wheel'] == selected_wheel].head(5)
-                
-                most_table = "<table style='width: 100%; border-collapse: collapse;'>"
-                most_table += "<tr><th style='border: 1px solid #ddd; padding: 8px; background-color: #1e88e5; color: white;'>Number</th>"
-                most_table += "<th style='border: 1px solid #ddd; padding: 8px; background-color: #1e88e5; color: white;'>Frequency</th></tr>"
-                
-                for _, row in most_wheel_data.iterrows():
-                    most_table += f"<tr><td style='border: 1px solid #ddd; padding: 8px; text-align: center;'>{row['number']}</td>"
-                    most_table += f"<td style='border: 1px solid #ddd; padding: 8px; text-align: center;'>{row['frequency']}</td></tr>"
-                
-                most_table += "</table>"
                 st.markdown(most_table, unsafe_allow_html=True)
             
             with col2:
                 st.markdown("<h4 style='text-align: center;'>Least Frequent Numbers</h4>", unsafe_allow_html=True)
-                least_wheel_data = least_frequent[least_frequent['wheel'] == selected_wheel].head(5)
-                
-                least_table = "<table style='width: 100%; border-collapse: collapse;'>"
-                least_table += "<tr><th style='border: 1px solid #ddd; padding: 8px; background-color: #f44336; color: white;'>Number</th>"
-                least_table += "<th style='border: 1px solid #ddd; padding: 8px; background-color: #f44336; color: white;'>Frequency</th></tr>"
-                
-                for _, row in least_wheel_data.iterrows():
-                    least_table += f"<tr><td style='border: 1px solid #ddd; padding: 8px; text-align: center;'>{row['number']}</td>"
-                    least_table += f"<td style='border: 1px solid #ddd; padding: 8px; text-align: center;'>{row['frequency']}</td></tr>"
-                
-                least_table += "</table>"
                 st.markdown(least_table, unsafe_allow_html=True)
             
             st.markdown("<h4 style='text-align: center;'>Last Draws</h4>", unsafe_allow_html=True)
@@ -289,28 +396,12 @@ def main():
             with col2:
                 num_draws = st.slider("Select number of last draws to display", min_value=1, max_value=10, value=3)
             
-            last_draws = lotto_data[lotto_data['wheel'] == selected_wheel].sort_values(by='date', ascending=False).head(num_draws)
+            last_draws = render_last_draws(
+                lotto_version, selected_wheel, frequency_window, num_draws, dataset.by_wheel('recent'), is_most_frequent, is_least_frequent
+            )
             
-            if not last_draws.empty:
-                for idx, (_, draw) in enumerate(last_draws.iterrows()):
-                    st.markdown(f"<h5 style='text-align: center;'>{draw['date'].strftime('%Y-%m-%d')}</h5>", unsafe_allow_html=True)
-                    
-                    numbers_html = "<div style='display: flex; gap: 10px; margin-bottom: 15px; justify-content: center;'>"
-                    most_freq_nums = most_frequent[most_frequent['wheel'] == selected_wheel]['number'].tolist()
-                    least_freq_nums = least_frequent[least_frequent['wheel'] == selected_wheel]['number'].tolist()
-                    
-                    for col in ['n1', 'n2', 'n3', 'n4', 'n5']:
-                        if col in draw and pd.notna(draw[col]):
-                            num = draw[col]
-                            if int(num) in most_freq_nums:
-                                numbers_html += f"<div style='background-color:#1e88e5;color:#ffffff;padding:15px;text-align:center;border-radius:4px;font-weight:bold;width:50px'>{num}</div>"
-                            elif int(num) in least_freq_nums:
-                                numbers_html += f"<div style='background-color:#f44336;color:#ffffff;padding:15px;text-align:center;border-radius:4px;font-weight:bold;width:50px'>{num}</div>"
-                            else:
-                                numbers_html += f"<div style='background-color:#f5f5f5;color:#212121;padding:15px;text-align:center;border-radius:4px;font-weight:bold;width:50px'>{num}</div>"
-                    
-                    numbers_html += "</div>"
-                    st.markdown(numbers_html, unsafe_allow_html=True)
+            if last_draws is not None:
+                st.markdown(last_draws, unsafe_allow_html=True)
             else:
                 st.warning("No draws found for the selected wheel.")
             
@@ -319,83 +410,35 @@ def main():
 
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
+                pattern_all_wheels = st.checkbox("Analyze all wheels", key="pattern_all_wheels")
+                pattern_wheel = None if pattern_all_wheels else selected_wheel
+                pattern_max_draws = len(count_cube.dates) if pattern_all_wheels else wheel_draw_count
                 pattern_draws = st.slider("Number of draws to analyze patterns", 
-                                        min_value=10, 
-                                        max_value=100, 
-                                        value=30,
+                                        min_value=min(10, pattern_max_draws), 
+                                        max_value=pattern_max_draws, 
+                                        value=min(30, pattern_max_draws),
                                         key="pattern_slider")
 
-            wheel_data = lotto_data[lotto_data['wheel'] == selected_wheel].sort_values(by='date', ascending=False).head(pattern_draws)
+            wheel_data = dataset.pattern_window(pattern_wheel, pattern_draws)
 
             if not wheel_data.empty:
-                total_draws = len(wheel_data)
-                odd_even_ratios = []
-                high_low_ratios = []
-                consecutive_counts = []
-                decade_distributions = {f"{i}-{i+9}": 0 for i in range(1, 91, 10)}
-                
-                for _, draw in wheel_data.iterrows():
-                    numbers = [draw[f'n{i}'] for i in range(1, 6)]
-                    numbers = [int(n) for n in numbers if pd.notna(n)]
-                    
-                    odd_count = sum(1 for n in numbers if n % 2 == 1)
-                    even_count = len(numbers) - odd_count
-                    odd_even_ratios.append((odd_count, even_count))
-                    
-                    high_count = sum(1 for n in numbers if n > 45)
-                    low_count = len(numbers) - high_count
-                    high_low_ratios.append((low_count, high_count))
-                    
-                    sorted_nums = sorted(numbers)
-                    consecutive = 0
-                    for i in range(len(sorted_nums) - 1):
-                        if sorted_nums[i + 1] - sorted_nums[i] == 1:
-                            consecutive += 1
-                    consecutive_counts.append(consecutive)
-                    
-                    for num in numbers:
-                        decade_start = 1 + ((num - 1) // 10) * 10
-                        decade_key = f"{decade_start}-{decade_start+9}"
-                        decade_distributions[decade_key] += 1
-                
-                odd_even_counts = {"5-0": 0, "4-1": 0, "3-2": 0, "2-3": 0, "1-4": 0, "0-5": 0}
-                for odd, even in odd_even_ratios:
-                    key = f"{odd}-{even}"
-                    if key in odd_even_counts:
-                        odd_even_counts[key] += 1
-                    
-                high_low_counts = {"5-0": 0, "4-1": 0, "3-2": 0, "2-3": 0, "1-4": 0, "0-5": 0}
-                for low, high in high_low_ratios:
-                    key = f"{low}-{high}"
-                    if key in high_low_counts:
-                        high_low_counts[key] += 1
-                        
-                consecutive_distribution = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0}
-                for count in consecutive_counts:
-                    if count in consecutive_distribution:
-                        consecutive_distribution[count] += 1
-                        
-                for key in decade_distributions:
-                    decade_distributions[key] /= total_draws
+                summary = pattern_summary(wheel_data)
+                total_draws = summary['total_draws']
+                odd_even_counts = summary['odd_even_counts']
+                high_low_counts = summary['high_low_counts']
+                consecutive_distribution = summary['consecutive_distribution']
+                decade_distributions = summary['decade_distributions']
                 
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     st.markdown("<h4 style='text-align: center;'>Odd-Even Distribution</h4>", unsafe_allow_html=True)
                     
-                    fig, ax = plt.subplots(figsize=(8, 5))
-                    patterns = list(odd_even_counts.keys())
-                    values = list(odd_even_counts.values())
-                    percentages = [v / total_draws * 100 for v in values]
-                    
-                    bars = ax.bar(patterns, percentages, color='#1e88e5')
-                    ax.set_ylabel('Percentage of Draws (%)')
-                    ax.set_title('Odd-Even Number Patterns')
-                    
-                    for i, v in enumerate(percentages):
-                        ax.text(i, v + 1, f"{v:.1f}%", ha='center')
-                    
-                    st.pyplot(fig)
+                    st.image(chart_cache.render(
+                        ('odd_even', pattern_wheel, pattern_draws, lotto_version), distribution_chart,
+                        list(odd_even_counts.keys()), [v / total_draws * 100 for v in odd_even_counts.values()],
+                        '#1e88e5', 'Odd-Even Number Patterns', 'Percentage of Draws (%)'
+                    ))
                     
                     most_common_odd_even = max(odd_even_counts.items(), key=lambda x: x[1])
                     st.markdown(f"<div style='text-align: center; padding: 10px; background-color: #f5f5f5; border-radius: 5px;'>"
@@ -407,19 +450,11 @@ def main():
                 with col2:
                     st.markdown("<h4 style='text-align: center;'>High-Low Distribution</h4>", unsafe_allow_html=True)
                     
-                    fig, ax = plt.subplots(figsize=(8, 5))
-                    patterns = list(high_low_counts.keys())
-                    values = list(high_low_counts.values())
-                    percentages = [v / total_draws * 100 for v in values]
-                    
-                    bars = ax.bar(patterns, percentages, color='#4caf50')
-                    ax.set_ylabel('Percentage of Draws (%)')
-                    ax.set_title('Low (1-45) - High (46-90) Number Patterns')
-                    
-                    for i, v in enumerate(percentages):
-                        ax.text(i, v + 1, f"{v:.1f}%", ha='center')
-                    
-                    st.pyplot(fig)
+                    st.image(chart_cache.render(
+                        ('high_low', pattern_wheel, pattern_draws, lotto_version), distribution_chart,
+                        list(high_low_counts.keys()), [v / total_draws * 100 for v in high_low_counts.values()],
+                        '#4caf50', 'Low (1-45) - High (46-90) Number Patterns', 'Percentage of Draws (%)'
+                    ))
                     
                     most_common_high_low = max(high_low_counts.items(), key=lambda x: x[1])
                     st.markdown(f"<div style='text-align: center; padding: 10px; background-color: #f5f5f5; border-radius: 5px;'>"
@@ -433,20 +468,11 @@ def main():
                 with col1:
                     st.markdown("<h4 style='text-align: center;'>Consecutive Numbers</h4>", unsafe_allow_html=True)
                     
-                    fig, ax = plt.subplots(figsize=(8, 5))
-                    patterns = list(consecutive_distribution.keys())
-                    values = list(consecutive_distribution.values())
-                    percentages = [v / total_draws * 100 for v in values]
-                    
-                    bars = ax.bar(patterns, percentages, color='#ff9800')
-                    ax.set_xlabel('Number of Consecutive Pairs')
-                    ax.set_ylabel('Percentage of Draws (%)')
-                    ax.set_title('Consecutive Number Pairs Distribution')
-                    
-                    for i, v in enumerate(percentages):
-                        ax.text(i, v + 1, f"{v:.1f}%", ha='center')
-                    
-                    st.pyplot(fig)
+                    st.image(chart_cache.render(
+                        ('consecutive', pattern_wheel, pattern_draws, lotto_version), distribution_chart,
+                        list(consecutive_distribution.keys()), [v / total_draws * 100 for v in consecutive_distribution.values()],
+                        '#ff9800', 'Consecutive Number Pairs Distribution', 'Percentage of Draws (%)', 'Number of Consecutive Pairs'
+                    ))
                     
                     most_common_consecutive = max(consecutive_distribution.items(), key=lambda x: x[1])
                     st.markdown(f"<div style='text-align: center; padding: 10px; background-color: #f5f5f5; border-radius: 5px;'>"
@@ -458,22 +484,11 @@ def main():
                 with col2:
                     st.markdown("<h4 style='text-align: center;'>Number Range Distribution</h4>", unsafe_allow_html=True)
                     
-                    fig, ax = plt.subplots(figsize=(8, 5))
-                    decades = list(decade_distributions.keys())
-                    values = list(decade_distributions.values())
-                    
-                    percentages = [v / 5 * 100 for v in values]
-                    
-                    bars = ax.bar(decades, percentages, color='#9c27b0')
-                    ax.set_xlabel('Number Range')
-                    ax.set_ylabel('Percentage (%)')
-                    ax.set_title('Number Range Distribution')
-                    plt.xticks(rotation=45)
-                    
-                    for i, v in enumerate(percentages):
-                        ax.text(i, v + 0.5, f"{v:.1f}%", ha='center')
-                    
-                    st.pyplot(fig)
+                    st.image(chart_cache.render(
+                        ('decades', pattern_wheel, pattern_draws, lotto_version), distribution_chart,
+                        list(decade_distributions.keys()), [v / 5 * 100 for v in decade_distributions.values()],
+                        '#9c27b0', 'Number Range Distribution', 'Percentage (%)', 'Number Range', 0.5, True
+                    ))
                     
                     most_common_decade = max(decade_distributions.items(), key=lambda x: x[1])
                     st.markdown(f"<div style='text-align: center; padding: 10px; background-color: #f5f5f5; border-radius: 5px;'>"
@@ -493,16 +508,16 @@ def main():
                         <td style='border: 1px solid #ddd; padding: 12px;'><b>Odd-Even Balance</b></td>
                         <td style='border: 1px solid #ddd; padding: 12px;'>
                             Most draws have a {most_common_odd_even[0]} (Odd-Even) distribution<br>
-                            Odd number frequency: {sum([odd for odd, _ in odd_even_ratios])/(total_draws*5)*100:.1f}%<br>
-                            Even number frequency: {sum([even for _, even in odd_even_ratios])/(total_draws*5)*100:.1f}%
+                            Odd number frequency: {summary['odd_numbers']/(total_draws*5)*100:.1f}%<br>
+                            Even number frequency: {summary['even_numbers']/(total_draws*5)*100:.1f}%
                         </td>
                     </tr>
                     <tr>
                         <td style='border: 1px solid #ddd; padding: 12px;'><b>High-Low Balance</b></td>
                         <td style='border: 1px solid #ddd; padding: 12px;'>
                             Most draws have a {most_common_high_low[0]} (Low-High) distribution<br>
-                            Low numbers (1-45) frequency: {sum([low for low, _ in high_low_ratios])/(total_draws*5)*100:.1f}%<br>
-                            High numbers (46-90) frequency: {sum([high for _, high in high_low_ratios])/(total_draws*5)*100:.1f}%
+                            Low numbers (1-45) frequency: {summary['low_numbers']/(total_draws*5)*100:.1f}%<br>
+                            High numbers (46-90) frequency: {summary['high_numbers']/(total_draws*5)*100:.1f}%
                         </td>
                     </tr>
                     <tr>
@@ -520,6 +535,13 @@ def main():
                             Least common range: {min(decade_distributions.items(), key=lambda x: x[1])[0]} ({min(decade_distributions.values())/total_draws*5*100:.1f}% of all numbers)
                         </td>
                     </tr>
+                    <tr>
+                        <td style='border: 1px solid #ddd; padding: 12px;'><b>Sum and Spread</b></td>
+                        <td style='border: 1px solid #ddd; padding: 12px;'>
+                            Average sum of the five numbers: {summary['mean_sum']:.1f}<br>
+                            Average spread (highest minus lowest): {summary['mean_spread']:.1f}
+                        </td>
+                    </tr>
                 </table>
                 """
                 
@@ -527,201 +549,286 @@ def main():
             else:
                 st.warning("No data available for pattern analysis. Please refresh data.")
     
-    with tab3:
-        if lotto_data.empty or most_frequent.empty or least_frequent.empty:
+    with tab3, METRICS.timer('lotto_stage_seconds', stage='tab_grid'):
+        if recent_draws.empty or most_frequent.empty or least_frequent.empty:
             st.warning("No data available. Please refresh the data.")
         else:
             st.markdown("<h3 style='text-align: center;'>Number Grid Analysis</h3>", unsafe_allow_html=True)
             
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
-                wheels = lotto_data['wheel'].unique()
+                wheels = dataset.wheels
                 selected_wheel = st.selectbox("Select Wheel", wheels, key="grid_wheel_selector")
+                grid_half_life = select_heat("Colour numbers by", "grid_colouring")
                 
-                num_draws_to_consider = st.slider(
-                    "Select number of draws to consider", 
-                    min_value=1, 
-                    max_value=20, 
-                    value=10, 
-                    key="grid_draws_slider"
-                )
-            
-            last_n_draws = lotto_data[lotto_data['wheel'] == selected_wheel].sort_values(by='date', ascending=False).head(num_draws_to_consider)
-            
-            recent_numbers = []
-            for col in ['n1', 'n2', 'n3', 'n4', 'n5']:
-                recent_numbers.extend(last_n_draws[col].tolist())
-            recent_numbers = [int(n) for n in recent_numbers]
-            
-            top_10_frequent = most_frequent[most_frequent['wheel'] == selected_wheel].head(10)['number'].tolist()
-            top_10_frequent = [int(n) for n in top_10_frequent]
-            
-            bottom_10_frequent = least_frequent[least_frequent['wheel'] == selected_wheel].head(10)['number'].tolist()
-            bottom_10_frequent = [int(n) for n in bottom_10_frequent]
-            
-            colors = {
-                'neutral': '#f5f5f5',
-                'recent': '#4caf50',
-                'most_freq': '#1e88e5',
-                'least_freq': '#f44336',
-                'recent_most': '#8bc34a',
-                'recent_least': '#ff9800',
-                'text_dark': '#212121',
-                'text_light': '#ffffff'
-            }
-            
-            st.markdown("<div style='display: flex; justify-content: center;'>", unsafe_allow_html=True)
-            legend_col1, legend_col2, legend_col3 = st.columns(3)
-            
-            with legend_col1:
-                st.markdown(f"""
-                <div style='display:flex;align-items:center;margin-bottom:10px'>
-                    <div style='background-color:{colors["recent"]};width:20px;height:20px;margin-right:10px'></div>
-                    <div>Recently drawn</div>
-                </div>
-                
-                <div style='display:flex;align-items:center;margin-bottom:10px'>
-                    <div style='background-color:{colors["recent_most"]};width:20px;height:20px;margin-right:10px'></div>
-                    <div>Recently drawn + Most frequent</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with legend_col2:
-                st.markdown(f"""
-                <div style='display:flex;align-items:center;margin-bottom:10px'>
-                    <div style='background-color:{colors["most_freq"]};width:20px;height:20px;margin-right:10px'></div>
-                    <div>Most frequent numbers</div>
-                </div>
-                
-                <div style='display:flex;align-items:center;margin-bottom:10px'>
-                    <div style='background-color:{colors["recent_least"]};width:20px;height:20px;margin-right:10px'></div>
-                    <div>Recently drawn + Least frequent</div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-            with legend_col3:
-                st.markdown(f"""
-                <div style='display:flex;align-items:center;margin-bottom:10px'>
-                    <div style='background-color:{colors["least_freq"]};width:20px;height:20px;margin-right:10px'></div>
-                    <div>Least frequent numbers</div>
-                </div>
-                
-                <div style='display:flex;align-items:center;margin-bottom:10px'>
-                    <div style='background-color:{colors["neutral"]};width:20px;height:20px;margin-right:10px'></div>
-                    <div>Other numbers</div>
-                </div>
-                """, unsafe_allow_html=True)
-            st.markdown("</div>", unsafe_allow_html=True)
+                if grid_half_life is None:
+                    num_draws_to_consider = st.slider(
+                        "Select number of draws to consider", 
+                        min_value=1, 
+                        max_value=20, 
+                        value=10, 
+                        key="grid_draws_slider"
+                    )
+            
+            colors = GRID_COLORS
+            
+            if grid_half_life is not None:
+                st.markdown(heat_legend(grid_half_life), unsafe_allow_html=True)
+            else:
+                st.markdown("<div style='display: flex; justify-content: center;'>", unsafe_allow_html=True)
+                legend_col1, legend_col2, legend_col3 = st.columns(3)
+            
+                with legend_col1:
+                    st.markdown(f"""
+                    <div style='display:flex;align-items:center;margin-bottom:10px'>
+                        <div style='background-color:{colors["recent"]};width:20px;height:20px;margin-right:10px'></div>
+                        <div>Recently drawn</div>
+                    </div>
+                
+                    <div style='display:flex;align-items:center;margin-bottom:10px'>
+                        <div style='background-color:{colors["recent_most"]};width:20px;height:20px;margin-right:10px'></div>
+                        <div>Recently drawn + Most frequent</div>
+                    </div>
+                    """, unsafe_allow_html=True)
+            
+                with legend_col2:
+                    st.markdown(f"""
+                    <div style='display:flex;align-items:center;margin-bottom:10px'>
+                        <div style='background-color:{colors["most_freq"]};width:20px;height:20px;margin-right:10px'></div>
+                        <div>Most frequent numbers</div>
+                    </div>
+                
+                    <div style='display:flex;align-items:center;margin-bottom:10px'>
+                        <div style='background-color:{colors["recent_least"]};width:20px;height:20px;margin-right:10px'></div>
+                        <div>Recently drawn + Least frequent</div>
+                    </div>
+                    """, unsafe_allow_html=True)
+                
+                with legend_col3:
+                    st.markdown(f"""
+                    <div style='display:flex;align-items:center;margin-bottom:10px'>
+                        <div style='background-color:{colors["least_freq"]};width:20px;height:20px;margin-right:10px'></div>
+                        <div>Least frequent numbers</div>
+                    </div>
+                
+                    <div style='display:flex;align-items:center;margin-bottom:10px'>
+                        <div style='background-color:{colors["neutral"]};width:20px;height:20px;margin-right:10px'></div>
+                        <div>Other numbers</div>
+                    </div>
+                    """, unsafe_allow_html=True)
+                st.markdown("</div>", unsafe_allow_html=True)
             
             col1, col2, col3 = st.columns([1, 10, 1])
             with col2:
-                grid_rows = 9
-                grid_cols = 10
-                
-                for i in range(grid_rows):
-                    cols = st.columns(grid_cols)
-                    for j in range(grid_cols):
-                        number = i * grid_cols + j + 1
-                        if number <= 90:
-                            is_recent = number in recent_numbers
-                            is_most_frequent = number in top_10_frequent
-                            is_least_frequent = number in bottom_10_frequent
-                            
-                            bg_color = colors['neutral']
-                            text_color = colors['text_dark']
-                            symbol = ""
-                            
-                            if is_recent and is_most_frequent:
-                                bg_color = colors['recent_most']
-                                text_color = colors['text_dark']
-                                symbol = "+"
-                            elif is_recent and is_least_frequent:
-                                bg_color = colors['recent_least']
-                                text_color = colors['text_dark']
-                                symbol = "-"
-                            elif is_recent:
-                                bg_color = colors['recent']
-                                text_color = colors['text_light']
-                            elif is_most_frequent:
-                                bg_color = colors['most_freq']
-                                text_color = colors['text_light']
-                            elif is_least_frequent:
-                                bg_color = colors['least_freq']
-                                text_color = colors['text_light']
-                            
-                            cols[j].markdown(
-                                f"<div style='background-color:{bg_color};color:{text_color};padding:10px;text-align:center;border-radius:4px;font-weight:bold;'>{number}{symbol}</div>",
-                                unsafe_allow_html=True
-                            )
-
-    with tab4:
+                if grid_half_life is not None:
+                    grid_html = render_heat_grid(lotto_version, selected_wheel, grid_half_life, dataset.heat)
+                else:
+                    grid_html = render_number_grid(
+                        lotto_version, selected_wheel, num_draws_to_consider, presence,
+                        dataset.by_wheel('most_frequent'), dataset.by_wheel('least_frequent'),
+                    )
+                st.markdown(grid_html, unsafe_allow_html=True)
+
+    with tab4, METRICS.timer('lotto_stage_seconds', stage='tab_delays'):
         st.markdown("<h3 style='text-align: center;'>Delays Analysis</h3>", unsafe_allow_html=True)
-        if lotto_data.empty:
+        if recent_draws.empty:
             st.warning("No data available. Please refresh the data.")
         else:
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
-                wheels = lotto_data['wheel'].unique()
+                wheels = dataset.wheels
                 selected_wheel = st.selectbox("Select a wheel", wheels, key="delay_wheel_selector")
             
-            delays = calculate_delays()
-            wheel_delays = delays[selected_wheel]
-            
-            delay_df = pd.DataFrame({
-                'Number': list(wheel_delays.keys()),
-                'Delay (days)': list(wheel_delays.values())
-            }).sort_values('Delay (days)', ascending=False)
-            
+            today = pd.Timestamp.now().floor('D')
+            delay_table, recent_table, delay_numbers, delay_days = render_delay_tables(
+                lotto_version, selected_wheel, today, presence
+            )
             col1, col2 = st.columns(2)
             
             with col1:
                 st.markdown("<h4 style='text-align: center;'>Numbers with the Longest Delays</h4>", unsafe_allow_html=True)
-                top_delays = delay_df.head(10)
-                
-                delay_table = "<table style='width: 100%; border-collapse: collapse;'>"
-                delay_table += "<tr><th style='border: 1px solid #ddd; padding: 8px; background-color: #f44336; color: white; text-align: center;'>Number</th>"
-                delay_table += "<th style='border: 1px solid #ddd; padding: 8px; background-color: #f44336; color: white; text-align: center;'>Delay (days)</th></tr>"
-                
-                for _, row in top_delays.iterrows():
-                    delay_table += f"<tr><td style='border: 1px solid #ddd; padding: 8px; text-align: center;'>{row['Number']}</td>"
-                    delay_table += f"<td style='border: 1px solid #ddd; padding: 8px; text-align: center;'>{row['Delay (days)']}</td></tr>"
-                
-                delay_table += "</table>"
                 st.markdown(delay_table, unsafe_allow_html=True)
                 
             with col2:
                 st.markdown("<h4 style='text-align: center;'>Recently Drawn Numbers</h4>", unsafe_allow_html=True)
-                recent_numbers = delay_df.tail(10).sort_values('Delay (days)')
-                
-                recent_table = "<table style='width: 100%; border-collapse: collapse;'>"
-                recent_table += "<tr><th style='border: 1px solid #ddd; padding: 8px; background-color: #4caf50; color: white; text-align: center;'>Number</th>"
-                recent_table += "<th style='border: 1px solid #ddd; padding: 8px; background-color: #4caf50; color: white; text-align: center;'>Delay (days)</th></tr>"
-                
-                for _, row in recent_numbers.iterrows():
-                    recent_table += f"<tr><td style='border: 1px solid #ddd; padding: 8px; text-align: center;'>{row['Number']}</td>"
-                    recent_table += f"<td style='border: 1px solid #ddd; padding: 8px; text-align: center;'>{row['Delay (days)']}</td></tr>"
-                
-                recent_table += "</table>"
                 st.markdown(recent_table, unsafe_allow_html=True)
             
             st.markdown("<h4 style='text-align: center;'>Delay Chart</h4>", unsafe_allow_html=True)
             
-            fig, ax = plt.subplots(figsize=(12, 6))
-            
-            normalized_delays = delay_df['Delay (days)'] / delay_df['Delay (days)'].max()
-            colors = plt.cm.RdYlGn_r(normalized_delays)
+            col1, col2, col3 = st.columns([1, 10, 1])
+            with col2:
+                st.image(chart_cache.render(
+                    ('delays', selected_wheel, today, lotto_version), delay_chart, delay_numbers, delay_days, selected_wheel
+                ))
             
-            bars = ax.bar(delay_df['Number'], delay_df['Delay (days)'], color=colors)
+            st.markdown("<h4 style='text-align: center;'>Historical Delays</h4>", unsafe_allow_html=True)
             
-            ax.set_xlabel('Number')
-            ax.set_ylabel('Delay (days)')
-            ax.set_title(f'Number Delays for {selected_wheel} Wheel')
-            ax.set_xticks(range(1, 91, 5))
-            ax.grid(axis='y', linestyle='--', alpha=0.7)
+            wheel_statistics = dataset.by_wheel('delay_statistics')[selected_wheel]
+            history_table = render_delay_history_table(lotto_version, selected_wheel, dataset)
+            st.markdown("<div style='text-align: center; margin-bottom: 10px;'>Numbers closest to their historical maximum delay (in draws)</div>", unsafe_allow_html=True)
+            st.markdown(history_table, unsafe_allow_html=True)
             
             col1, col2, col3 = st.columns([1, 10, 1])
             with col2:
-                st.pyplot(fig)
+                st.image(chart_cache.render(
+                    ('delay_history', selected_wheel, lotto_version), delay_history_chart, wheel_statistics, selected_wheel
+                ))
+
+    with tab5, METRICS.timer('lotto_stage_seconds', stage='tab_combinations'):
+        st.markdown("<h3 style='text-align: center;'>Ambi & Terni</h3>", unsafe_allow_html=True)
+        if recent_draws.empty:
+            st.warning("No data available. Please refresh the data.")
+        else:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col2:
+                wheels = dataset.wheels
+                selected_wheel = st.selectbox("Select a wheel", wheels, key="combo_wheel_selector")
+                
+                combo_full_history = st.checkbox("Whole history", value=True, key="combo_full_history")
+                combo_draws = None
+                if not combo_full_history:
+                    wheel_draw_count = count_cube.draw_count(selected_wheel)
+                    combo_draws = st.slider(
+                        "Number of draws to consider",
+                        min_value=1,
+                        max_value=wheel_draw_count,
+                        value=min(100, wheel_draw_count),
+                        key="combo_draws_slider"
+                    )
+                combo_count = st.slider("Combinations to list", min_value=5, max_value=30, value=10, key="combo_count_slider")
+            
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                st.markdown("<h4 style='text-align: center;'>Most Frequent Ambi</h4>", unsafe_allow_html=True)
+                pairs, counts = cooccurrence.ranked_pairs(selected_wheel, combo_count, last_n=combo_draws)
+                st.markdown(combination_table(pairs, counts, "Ambo", '#1e88e5'), unsafe_allow_html=True)
+            
+            with col2:
+                st.markdown("<h4 style='text-align: center;'>Least Frequent Ambi</h4>", unsafe_allow_html=True)
+                pairs, counts = cooccurrence.ranked_pairs(selected_wheel, combo_count, last_n=combo_draws, largest=False)
+                st.markdown(combination_table(pairs, counts, "Ambo", '#f44336'), unsafe_allow_html=True)
+            
+            with col3:
+                st.markdown("<h4 style='text-align: center;'>Most Frequent Terni</h4>", unsafe_allow_html=True)
+                triples, counts = cooccurrence.ranked_triples(selected_wheel, combo_count, last_n=combo_draws)
+                st.markdown(combination_table(triples, counts, "Terno", '#4caf50'), unsafe_allow_html=True)
+
+    with tab6, METRICS.timer('lotto_stage_seconds', stage='tab_backtest'):
+        st.markdown("<h3 style='text-align: center;'>Strategy Backtest</h3>", unsafe_allow_html=True)
+        if recent_draws.empty:
+            st.warning("No data available. Please refresh the data.")
+        else:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col2:
+                wheels = dataset.wheels
+                selected_wheel = st.selectbox("Select a wheel", wheels, key="backtest_wheel_selector")
+                
+                backtests = calculate_backtests(lotto_version, selected_wheel, presence)
+                sizes = sorted(backtests['k'].unique())
+                backtest_k = st.select_slider("Numbers played per draw", options=sizes, value=10 if 10 in sizes else sizes[0], key="backtest_k_slider")
+            
+            results = backtests[backtests['k'] == backtest_k]
+            draws = int(results['draws'].iloc[0]) if len(results) else 0
+            expected = backtest_k * 5 / 90
+            st.markdown(f"<div style='text-align: center; margin-bottom: 10px;'>Each strategy picks {backtest_k} numbers using only earlier draws and is scored on the next one. Scored over the last {draws} draws; pure chance averages {expected:.3f} hits per draw.</div>", unsafe_allow_html=True)
+            
+            backtest_table = render_backtest_table(lotto_version, selected_wheel, backtest_k, presence)
+            st.markdown(backtest_table, unsafe_allow_html=True)
+
+    with tab7, METRICS.timer('lotto_stage_seconds', stage='tab_spy_numbers'):
+        st.markdown("<h3 style='text-align: center;'>Spy Numbers</h3>", unsafe_allow_html=True)
+        if recent_draws.empty:
+            st.warning("No data available. Please refresh the data.")
+        else:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col2:
+                wheels = dataset.wheels
+                selected_wheel = st.selectbox("When this wheel draws", wheels, key="spy_wheel_selector")
+                spy_number = st.selectbox("the number", list(range(1, 91)), key="spy_number_selector")
+                target_wheel = st.selectbox("list what follows on", ["The same wheel"] + wheels, key="spy_target_selector")
+                target_wheel = None if target_wheel == "The same wheel" else target_wheel
+                spy_exact = st.radio("Count numbers drawn", ["Within the next draws", "Exactly that many draws later"], horizontal=True, key="spy_mode") != "Within the next draws"
+                spy_draws = st.slider("Draws", min_value=1, max_value=MAX_LAG, value=3, key="spy_draws_slider")
+                spy_count = st.slider("Numbers to list", min_value=5, max_value=30, value=10, key="spy_count_slider")
+            
+            followers_table, occurrences = render_followers_table(
+                lotto_version, selected_wheel, spy_number, spy_draws, target_wheel, spy_exact, spy_count, dataset.transitions
+            )
+            span = f"exactly {spy_draws} draws later" if spy_exact else f"within the next {spy_draws} draws"
+            st.markdown(f"<div style='text-align: center; margin-bottom: 10px;'>{spy_number} came out {occurrences} times on {selected_wheel}. Numbers drawn on {target_wheel or selected_wheel} {span}, with how often that happened after any {selected_wheel} draw for comparison.</div>", unsafe_allow_html=True)
+            st.markdown(followers_table, unsafe_allow_html=True)
+    
+    show_diagnostics(dataset, chart_cache)
+
+def export_metrics():
+    dataset = load_registry().current()
+    chart_cache = load_chart_cache()
+    for name, value in chart_cache.stats().items():
+        METRICS.set(f'lotto_chart_cache_{name}', value)
+    METRICS.set('lotto_dataset_draws', len(dataset.history))
+    METRICS.set('lotto_dataset_loaded_partitions', len(dataset.history.loaded_years))
+    metrics_file = os.environ.get('LOTTO_METRICS_FILE')
+    if metrics_file:
+        METRICS.write_prometheus(metrics_file)
+
+def show_diagnostics(dataset, chart_cache):
+    with st.expander("Diagnostics"):
+        chart_stats = chart_cache.stats()
+        st.markdown(
+            f"Dataset {dataset.version} · {len(dataset.history)} rows in {len(dataset.history.partitions)} yearly partitions · "
+            f"{len(dataset.history.loaded_years)} read, {len(dataset.recent)} recent rows "
+            f"({dataset.recent.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MB) in memory"
+        )
+        st.markdown(
+            f"{chart_stats['entries']} charts, {chart_stats['bytes'] / 1024 / 1024:.1f} of {chart_stats['max_bytes'] / 1024 / 1024:.0f} MB · "
+            f"{chart_stats['hits']} hits, {chart_stats['misses']} misses ({chart_stats['hit_rate']:.0%} hit rate), {chart_stats['evictions']} evictions"
+        )
+
+        timings = METRICS.timings()
+        if timings:
+            st.markdown(html_table(pd.DataFrame({
+                'Metric': [name.removeprefix('lotto_').removesuffix('_seconds') for name, *_ in timings],
+                'Stage': [', '.join(labels.values()) for _, labels, *_ in timings],
+                'Runs': [count for _, _, count, *_ in timings],
+                'Total (ms)': [f"{total * 1000:.1f}" for _, _, _, total, _, _ in timings],
+                'Mean (ms)': [f"{total / count * 1000:.1f}" for _, _, count, total, _, _ in timings],
+                'Max (ms)': [f"{longest * 1000:.1f}" for *_, longest, _ in timings],
+                'Last (ms)': [f"{last * 1000:.1f}" for *_, last in timings],
+            }), '#1e88e5', label_column=True), unsafe_allow_html=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.checkbox("Profile the next rerun", key="profile_next_rerun")
+        with col2:
+            st.download_button("Download metrics", METRICS.prometheus_text(), file_name="lotto.prom", mime="text/plain")
+
+        report = st.session_state.get('profile_report')
+        if report is not None:
+            st.code(report['text'], language=None)
+            st.download_button("Download profile", report['data'], file_name="lotto.prof")
+
+def main():
+    # Times the whole rerun and, when asked for in the diagnostics panel,
+    # profiles one rerun with cProfile. Set LOTTO_METRICS_FILE to write the
+    # metrics for a Prometheus textfile collector after every rerun, or
+    # LOTTO_METRICS_PORT to serve them on /metrics.
+    metrics_port = os.environ.get('LOTTO_METRICS_PORT')
+    if metrics_port:
+        start_metrics_server(int(metrics_port))
+
+    profile = st.session_state.get('profile_next_rerun', False)
+    if profile:
+        st.session_state['profile_next_rerun'] = False
+    with METRICS.timer('lotto_stage_seconds', stage='rerun'):
+        if profile:
+            st.session_state['profile_report'] = profile_call(show_page)
+        else:
+            show_page()
+    export_metrics()
+    if profile:
+        # Once more, so the panel shows the report just taken.
+        st.rerun()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,20 @@
+from .backtest import BacktestConfig, run_backtests, sweep
+from .cooccurrence import CooccurrenceIndex
+from .cube import CountCube, rank_numbers
+from .dataset import NUMBER_COLUMNS, WHEEL_CODES, WHEELS
+from .dateindex import DateIndex
+from .delays import DelayHistory, current_delays
+from .download import Downloader, DownloadError, verify_archive
+from .frequencies import frequency_tables, save_frequency_tables
+from .heat import HALF_LIVES, HeatIndex
+from .history import PartitionedHistory, StalePartitionError, migrate_history
+from .parser import read_archive_chunks
+from .patterns import DECADES, pattern_features, pattern_summary
+from .presence import Presence, PresenceIndex
+from .refresh import ARCHIVE_URL, RefreshJob, refresh
+from .simulation import null_distribution, randomness_report
+from .snapshot import Dataset, DatasetRegistry
+from .store import history_frame, load_stats, migrate_csv, read_history
+from .transitions import MAX_LAG, TransitionIndex
+from .wheels import WheelViews
+from .workspace import ensure_dirs, load_cooccurrence, load_delay_statistics, load_heat, load_index, load_presence
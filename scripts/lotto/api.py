@@ -0,0 +1,267 @@
+import asyncio
+import datetime
+import json
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from .dataset import NUMBER_COLUMNS, WHEELS
+from .delays import current_delays
+from .frequencies import FREQUENCY_WINDOW
+from .metrics import METRICS
+from .snapshot import DatasetRegistry
+from .workspace import DATA_DIR
+
+API_HOST = '127.0.0.1'
+API_PORT = 8765
+RESPONSE_CACHE_ENTRIES = 1024
+# A /draws span wider than this many draw dates is refused.
+MAX_DRAW_DATES = 5000
+MAX_REQUEST_BYTES = 16 * 1024
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _param(query, name, default=None):
+    values = query.get(name)
+    return values[-1] if values else default
+
+
+def _wheels(query):
+    wheel = _param(query, 'wheel')
+    if wheel is None:
+        return None
+    if wheel.upper() not in WHEELS:
+        raise BadRequest(f"unknown wheel {wheel!r}")
+    return [wheel.upper()]
+
+
+def _positive_int(query, name, default):
+    value = _param(query, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer") from None
+    if number < 1:
+        raise BadRequest(f"{name} must be at least 1")
+    return number
+
+
+def _date(query, name, default):
+    value = _param(query, name)
+    if value is None:
+        return default
+    try:
+        return np.datetime64(value.replace('/', '-'), 'D')
+    except ValueError:
+        raise BadRequest(f"{name} must be a date like 2024-01-31") from None
+
+
+def _records(frame):
+    return json.loads(frame.to_json(orient='records'))
+
+
+def frequencies_response(dataset, query):
+    wheels = _wheels(query)
+    window = _positive_int(query, 'window', FREQUENCY_WINDOW)
+    cube = dataset.count_cube
+    rows = []
+    for wheel in wheels or cube.wheels:
+        counts, draws = cube.window(wheel, window)
+        if draws or wheels:
+            rows.append({'wheel': wheel, 'draws': draws, 'frequencies': counts.tolist()})
+    return {'window': window, 'wheels': rows}
+
+
+def delays_response(dataset, query):
+    wheels = _wheels(query)
+    delays = current_delays(dataset.presence)
+    statistics = dataset.delay_statistics.drop(columns='current_delay')
+    table = delays.merge(statistics, on=['wheel', 'number'], how='left')
+    if wheels:
+        table = table[table['wheel'].isin(wheels)]
+    table['last_date'] = table['last_date'].dt.strftime('%Y-%m-%d')
+    return {'rows': _records(table)}
+
+
+def draws_response(dataset, query):
+    # Every wheel's draws dated from `from` to `to`, both included. Either
+    # bound alone gives that one date plus, for `from`, everything after it;
+    # neither gives the last draw.
+    index = dataset.date_index
+    wheels = _wheels(query)
+    if not len(index):
+        return {'from': None, 'to': None, 'draws': []}
+    end = _date(query, 'to', index.dates[-1])
+    start = _date(query, 'from', end)
+
+    dates = np.searchsorted(index.dates, end, side='right') - np.searchsorted(index.dates, start, side='left')
+    if dates > MAX_DRAW_DATES:
+        raise BadRequest(f"the span holds {dates} draw dates, at most {MAX_DRAW_DATES} are returned at once")
+
+    draws = dataset.draws(start, end)
+    if wheels:
+        draws = draws[draws['wheel'].isin(wheels)]
+    numbers = draws[NUMBER_COLUMNS].to_numpy(dtype=float, na_value=np.nan)
+    rows = pd.DataFrame({
+        'date': draws['date'].dt.strftime('%Y-%m-%d').to_numpy(),
+        'wheel': draws['wheel'].astype(str).to_numpy(),
+    })
+    rows['numbers'] = [[int(n) for n in row if n == n] for row in numbers]
+    return {'from': str(start), 'to': str(end), 'draws': rows.to_dict(orient='records')}
+
+
+def status_response(dataset, query):
+    index = dataset.date_index
+    return {
+        'draws': len(dataset.history),
+        'dates': len(index),
+        'first_date': str(index.dates[0]) if len(index) else None,
+        'last_date': str(index.dates[-1]) if len(index) else None,
+    }
+
+
+ENDPOINTS = {
+    '/': status_response,
+    '/frequencies': frequencies_response,
+    '/delays': delays_response,
+    '/draws': draws_response,
+}
+
+
+class StatisticsAPI:
+    # Answers the endpoints from the registry's current Dataset. Responses
+    # are cached as encoded bodies keyed by dataset version, day, path and
+    # query, so a refresh starts a fresh set of keys and old ones age out.
+    # Identical requests arriving while one is being computed wait for it
+    # instead of computing it again; computing runs in a worker thread so
+    # the event loop keeps serving cached responses meanwhile.
+
+    def __init__(self, registry=None, max_entries=RESPONSE_CACHE_ENTRIES):
+        self.registry = registry or DatasetRegistry()
+        self.max_entries = max_entries
+        self._responses = OrderedDict()
+        self._pending = {}
+
+    def _compute(self, endpoint, dataset, query):
+        with METRICS.timer('lotto_api_compute_seconds', endpoint=endpoint.__name__):
+            body = endpoint(dataset, query)
+        body['version'] = dataset.version
+        return json.dumps(body, separators=(',', ':')).encode()
+
+    async def respond(self, target):
+        # (status, body) for a request target like /draws?from=2024-01-01.
+        url = urlsplit(target)
+        endpoint = ENDPOINTS.get(url.path.rstrip('/') or '/')
+        if endpoint is None:
+            return 404, {'error': f"no endpoint {url.path}", 'endpoints': sorted(ENDPOINTS)}
+
+        query = parse_qs(url.query)
+        # After a refresh this loads the new Dataset, so not on the loop.
+        dataset = await asyncio.to_thread(self.registry.current)
+        # Delays in days change at midnight, so the date is part of the key.
+        key = (
+            dataset.version, datetime.date.today(), endpoint.__name__,
+            tuple(sorted((k, tuple(v)) for k, v in query.items())),
+        )
+        body = self._responses.get(key)
+        if body is not None:
+            self._responses.move_to_end(key)
+            METRICS.increment('lotto_api_cache_hits_total')
+            return 200, body
+
+        pending = self._pending.get(key)
+        if pending is None:
+            METRICS.increment('lotto_api_cache_misses_total')
+            pending = self._pending[key] = asyncio.ensure_future(
+                asyncio.to_thread(self._compute, endpoint, dataset, query)
+            )
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        try:
+            body = await asyncio.shield(pending)
+        except BadRequest as error:
+            return 400, {'error': str(error)}
+
+        self._responses[key] = body
+        while len(self._responses) > self.max_entries:
+            self._responses.popitem(last=False)
+        return 200, body
+
+    async def handle(self, reader, writer):
+        # One connection: HTTP/1.1 GET requests, kept alive until the client
+        # closes it or asks to.
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                except ValueError:
+                    await self._send(writer, 400, {'error': "malformed request line"}, False)
+                    break
+                headers = dict(
+                    (name.strip().lower(), value.strip())
+                    for name, _, value in (line.partition(':') for line in lines[1:] if line)
+                )
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_REQUEST_BYTES:
+                    await self._send(writer, 400, {'error': "invalid Content-Length"}, False)
+                    break
+                try:
+                    await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+                with METRICS.timer('lotto_api_request_seconds'):
+                    if method not in ('GET', 'HEAD'):
+                        status, body = 405, {'error': "only GET is supported"}
+                    else:
+                        try:
+                            status, body = await self.respond(target)
+                        except Exception as error:
+                            status, body = 500, {'error': str(error)}
+                    await self._send(writer, status, body, keep_alive, head_only=method == 'HEAD')
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def _send(self, writer, status, body, keep_alive, head_only=False):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        writer.write((
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode('latin-1'))
+        if not head_only:
+            writer.write(body)
+        await writer.drain()
+
+    async def serve(self, host=API_HOST, port=API_PORT):
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_REQUEST_BYTES)
+        async with server:
+            await server.serve_forever()
+
+
+def serve(data_dir=DATA_DIR, host=API_HOST, port=API_PORT):
+    # Loads the dataset up front so the first request does not pay for it.
+    api = StatisticsAPI(DatasetRegistry(data_dir))
+    api.registry.current()
+    asyncio.run(api.serve(host, port))
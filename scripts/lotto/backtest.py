@@ -0,0 +1,166 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from .presence import Presence
+
+STRATEGIES = ['hot', 'cold', 'delay']
+SWEEP_WINDOWS = [10, 25, 50, 100, 200, 500, 1000]
+SWEEP_SIZES = [1, 2, 3, 5, 10, 15, 20]
+NUMBERS_PER_DRAW = 5
+
+BacktestConfig = namedtuple('BacktestConfig', ['wheel', 'strategy', 'window', 'k'])
+
+RESULT_COLUMNS = [
+    'wheel', 'strategy', 'window', 'k', 'draws', 'hits', 'mean_hits', 'expected_hits', 'lift',
+    'hit_rate', 'ambo_rate', 'terno_rate',
+]
+
+# Presence per (file, dates, digest) in a pool worker, loaded on first use.
+_worker_presence = {}
+
+
+def sweep(wheels, strategies=STRATEGIES, windows=SWEEP_WINDOWS, sizes=SWEEP_SIZES):
+    # Every combination of wheel, strategy, window and pick size. The delay
+    # strategy looks at the whole past, so it gets a single window of None.
+    configs = []
+    for wheel, strategy, k in product(wheels, strategies, sizes):
+        for window in ([None] if strategy == 'delay' else windows):
+            configs.append(BacktestConfig(wheel, strategy, window, k))
+    return configs
+
+
+def _warmup(configs):
+    # All configs are scored on the same draws: the ones that come after
+    # the longest window, so every hot/cold window is full.
+    return max([config.window for config in configs if config.window] or [0])
+
+
+class WheelSeries:
+    # The draws of one wheel in order, with running counts and the index of
+    # each number's last appearance before every draw.
+
+    def __init__(self, presence, wheel):
+        w = presence.wheel_index(wheel)
+        self.draws = np.ascontiguousarray(presence.matrix[presence.drawn[:, w], w])
+        steps = np.arange(len(self.draws))
+
+        self.cumulative = np.zeros((len(self.draws) + 1, 90), dtype=np.int32)
+        np.cumsum(self.draws, axis=0, out=self.cumulative[1:])
+        self.last_seen = np.full((len(self.draws) + 1, 90), -1, dtype=np.int32)
+        np.maximum.accumulate(np.where(self.draws, steps[:, None], -1), axis=0, out=self.last_seen[1:])
+
+    def __len__(self):
+        return len(self.draws)
+
+    def ranking(self, strategy, window, steps):
+        # Numbers ordered best first for each draw in `steps`, using only
+        # the draws before it. Ties go to the lower number.
+        if strategy == 'delay':
+            key = self.last_seen[steps] - steps[:, None]
+        elif strategy in ('hot', 'cold'):
+            counts = self.cumulative[steps] - self.cumulative[np.maximum(steps - window, 0)]
+            key = -counts if strategy == 'hot' else counts
+        else:
+            raise ValueError(f"Unknown strategy: {strategy}")
+        return np.argsort(key, axis=1, kind='stable')
+
+
+def backtest_wheel(series, wheel, configs, warmup):
+    # Configs sharing a strategy and window share one ranking; each pick
+    # size is then a prefix of it, so hits for every k come from one cumsum.
+    steps = np.arange(min(warmup, len(series)), len(series))
+    rows = []
+    groups = {}
+    for config in configs:
+        groups.setdefault((config.strategy, config.window), []).append(config)
+
+    for (strategy, window), group in groups.items():
+        largest = max(config.k for config in group)
+        order = series.ranking(strategy, window, steps)[:, :largest]
+        cumulative_hits = np.take_along_axis(series.draws[steps], order, axis=1).cumsum(axis=1)
+        for config in group:
+            hits = cumulative_hits[:, config.k - 1] if len(steps) else np.zeros(0, dtype=np.int64)
+            expected = config.k * NUMBERS_PER_DRAW / 90
+            mean_hits = hits.mean() if len(hits) else np.nan
+            rows.append({
+                'wheel': wheel,
+                'strategy': strategy,
+                'window': window,
+                'k': config.k,
+                'draws': len(hits),
+                'hits': int(hits.sum()),
+                'mean_hits': mean_hits,
+                'expected_hits': expected,
+                'lift': mean_hits / expected,
+                'hit_rate': (hits >= 1).mean() if len(hits) else np.nan,
+                'ambo_rate': (hits >= 2).mean() if len(hits) else np.nan,
+                'terno_rate': (hits >= 3).mean() if len(hits) else np.nan,
+            })
+    return rows
+
+
+def _open_presence(presence_file, dates, digest):
+    # The first `dates` records of the presence file, which must be the
+    # ones the parent backtests: a refresh may have replaced the file
+    # since, and an extended one still holds them.
+    key = (presence_file, dates, digest)
+    if key not in _worker_presence:
+        presence = Presence.load(presence_file)
+        if len(presence) < dates or presence.prefix_digest(dates) != digest:
+            raise RuntimeError(f"{presence_file} no longer holds the draws being backtested")
+        _worker_presence.clear()
+        _worker_presence[key] = Presence(presence.records[:dates])
+    return _worker_presence[key]
+
+
+def _run_task(source, wheel, configs, warmup):
+    return backtest_wheel(WheelSeries(_open_presence(*source), wheel), wheel, configs, warmup)
+
+
+def _tasks(configs, workers):
+    # One task per wheel, split further by strategy/window group when there
+    # are more workers than wheels.
+    by_wheel = {}
+    for config in configs:
+        by_wheel.setdefault(config.wheel, {}).setdefault((config.strategy, config.window), []).append(config)
+
+    pieces = max(1, -(-workers // max(len(by_wheel), 1)))
+    for wheel, groups in by_wheel.items():
+        groups = list(groups.values())
+        for i in range(min(pieces, len(groups))):
+            yield wheel, [config for group in groups[i::pieces] for config in group]
+
+
+def run_backtests(configs, presence, workers=1, warmup=None, presence_file=None):
+    # Scores every config on each draw of its wheel. With workers > 1 (None
+    # for one per core) and the file `presence` was loaded from
+    # (workspace.presence_file), the work is spread over a process pool
+    # whose workers memory-map that file instead of receiving the arrays;
+    # otherwise everything runs in this process.
+    configs = list(configs)
+    warmup = _warmup(configs) if warmup is None else warmup
+
+    rows = []
+    if workers == 1 or presence_file is None:
+        series = {}
+        for wheel, task_configs in _tasks(configs, 1):
+            if wheel not in series:
+                series[wheel] = WheelSeries(presence, wheel)
+            rows.extend(backtest_wheel(series[wheel], wheel, task_configs, warmup))
+    else:
+        workers = workers or os.cpu_count() or 1
+        source = (os.path.abspath(presence_file), len(presence), presence.prefix_digest(len(presence)))
+        tasks = list(_tasks(configs, workers))
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)) or 1) as executor:
+            futures = [executor.submit(_run_task, source, wheel, task_configs, warmup) for wheel, task_configs in tasks]
+            for future in futures:
+                rows.extend(future.result())
+
+    results = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    results['window'] = results['window'].astype('Int64')
+    return results.sort_values(['wheel', 'strategy', 'window', 'k'], kind='stable', ignore_index=True)
@@ -0,0 +1,187 @@
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from .backtest import run_backtests, sweep
+from .cooccurrence import CooccurrenceIndex
+from .cube import CountCube
+from .dataset import NUMBER_COLUMNS, WHEEL_CODES, WHEELS
+from .delays import DelayHistory, current_delays
+from .frequencies import frequency_tables
+from .history import RECENT_DRAWS, PartitionWriter, PartitionedHistory
+from .parser import ARCHIVE_MEMBER, chunk_to_frame, read_archive_chunks
+from .patterns import pattern_features, pattern_summary
+from .presence import Presence
+from .simulation import random_numbers
+from .store import HISTORY_COLUMNS, StagedFiles, chunk_to_records, history_frame
+from .transitions import TransitionIndex
+from .wheels import WheelViews
+
+# The real archive holds about 3,600 draw dates for ten or eleven wheels.
+BASE_DATES = 3600
+# The default scales; 100x is opt-in (--scale 100), it takes several minutes
+# and about 4 GB of memory.
+SCALES = [1, 10]
+END_DATE = np.datetime64('2025-12-31')
+# benchmarks/ at the top of the repository, wherever the command runs from.
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'benchmarks')
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+TOLERANCE = 0.25
+# Slowdowns under this many seconds are noise, whatever the ratio.
+MIN_SLOWDOWN = 0.005
+
+WHEEL_CODE = {wheel: code for code, wheel in WHEEL_CODES.items()}
+
+
+def synthetic_archive(path, scale=1, seed=0):
+    # Writes a zip shaped like the real one: one storico01-oggi.txt line
+    # per date and wheel with uniform random numbers, one draw a day ending
+    # on END_DATE. Returns the number of lines.
+    rng = np.random.default_rng(seed)
+    dates = END_DATE - np.arange(BASE_DATES * scale)[::-1]
+    numbers = rng.permuted(random_numbers(rng, (len(dates) * len(WHEELS),)) + 1, axis=-1)
+
+    lines = pd.DataFrame({
+        'date': np.repeat(np.char.replace(np.datetime_as_string(dates), '-', '/'), len(WHEELS)),
+        'wheel': np.tile([WHEEL_CODE[wheel] for wheel in WHEELS], len(dates)),
+    })
+    for i, column in enumerate(NUMBER_COLUMNS):
+        lines[column] = numbers[:, i]
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        with zip_ref.open(ARCHIVE_MEMBER, 'w') as member:
+            member.write(lines.to_csv(sep='\t', header=False, index=False, lineterminator='\r\n').encode())
+    return len(lines)
+
+
+def parse_archive(archive_file, history_dir, history_csv):
+    # The parse phase of a full refresh, partitions and manifest included.
+    os.makedirs(history_dir, exist_ok=True)
+    pd.DataFrame(columns=HISTORY_COLUMNS).to_csv(history_csv, index=False, lineterminator='\r\n')
+    with StagedFiles() as staged:
+        writer = PartitionWriter(PartitionedHistory(history_dir, {'partitions': []}), staged, fresh=True)
+        for chunk in read_archive_chunks(archive_file):
+            writer.append(chunk_to_records(chunk))
+            chunk_to_frame(chunk).to_csv(history_csv, mode='a', header=False, index=False, lineterminator='\r\n')
+        writer.finish()
+        staged.commit()
+
+
+def pattern_loop(features, window=100):
+    views = WheelViews(features)
+    return [pattern_summary(views.tail(wheel, window)) for wheel in WHEELS]
+
+
+def cube_windows(cube, window=100):
+    return [cube.window(wheel, window) for wheel in cube.wheels]
+
+
+def cooccurrence_ranking(presence):
+    index = CooccurrenceIndex(presence)
+    index.extend()
+    return [(index.ranked_pairs(wheel), index.ranked_triples(wheel)) for wheel in WHEELS]
+
+
+def stages(work_dir):
+    # (name, function) in pipeline order. Each function gets the results of
+    # the stages before it by name.
+    archive_file = os.path.join(work_dir, 'lotto_historical.zip')
+    history_dir = os.path.join(work_dir, 'history')
+    history_csv = os.path.join(work_dir, 'lotto_historical.csv')
+    return [
+        ('parse', lambda r: parse_archive(archive_file, history_dir, history_csv)),
+        ('load', lambda r: history_frame(PartitionedHistory(history_dir).records())),
+        ('load_recent', lambda r: history_frame(PartitionedHistory(history_dir).tail(RECENT_DRAWS))),
+        ('frequencies', lambda r: frequency_tables(r['load'])),
+        ('presence', lambda r: Presence.from_frame(r['load'])),
+        ('count_cube', lambda r: cube_windows(CountCube(r['presence']))),
+        ('delays', lambda r: current_delays(r['presence'], pd.Timestamp(END_DATE))),
+        ('delay_history', lambda r: DelayHistory.from_presence(r['presence']).statistics()),
+        ('patterns', lambda r: pattern_loop(pattern_features(r['load']))),
+        ('cooccurrence', lambda r: cooccurrence_ranking(r['presence'])),
+        ('transitions', lambda r: TransitionIndex(r['presence']).within(3)),
+        ('backtest', lambda r: run_backtests(sweep(['BARI']), presence=r['presence'])),
+    ]
+
+
+def run_stage(function, results, repeat):
+    # Best wall time of `repeat` runs, then one more run under tracemalloc
+    # for the peak of memory allocated during the stage (numpy and pandas
+    # buffers included). Tracing slows code down, so it is never timed.
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(results)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        del result
+
+    tracemalloc.start()
+    try:
+        result = function(results)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def run_benchmarks(scales=SCALES, repeat=3, seed=0, only=None, report=print):
+    # {scale: {stage: {'seconds', 'peak_bytes'}}} with scales as strings, as
+    # they come back from JSON. `only` limits the stages run (the ones they
+    # depend on still run, untimed).
+    results = {}
+    for scale in scales:
+        with tempfile.TemporaryDirectory(prefix='lotto-bench-') as work_dir:
+            lines = synthetic_archive(os.path.join(work_dir, 'lotto_historical.zip'), scale, seed)
+            report(f"scale {scale}x: {lines} draws")
+            timings = {}
+            outputs = {}
+            for name, function in stages(work_dir):
+                if only and name not in only:
+                    outputs[name] = function(outputs)
+                    continue
+                outputs[name], seconds, peak = run_stage(function, outputs, repeat)
+                timings[name] = {'seconds': seconds, 'peak_bytes': peak}
+                report(f"  {name:<14} {seconds * 1000:10.1f} ms {peak / 1024 / 1024:10.1f} MB")
+            results[str(scale)] = timings
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    # Stages slower, or peaking higher, than the baseline by more than
+    # `tolerance`. Stages or scales missing from the baseline are skipped.
+    regressions = []
+    for scale, timings in results.items():
+        for stage, current in timings.items():
+            previous = baseline.get(scale, {}).get(stage)
+            if previous is None:
+                continue
+            slowdown = current['seconds'] - previous['seconds']
+            if slowdown > MIN_SLOWDOWN and current['seconds'] > previous['seconds'] * (1 + tolerance):
+                regressions.append((scale, stage, 'seconds', previous['seconds'], current['seconds']))
+            if current['peak_bytes'] > previous['peak_bytes'] * (1 + tolerance):
+                regressions.append((scale, stage, 'peak_bytes', previous['peak_bytes'], current['peak_bytes']))
+    return regressions
+
+
+def load_baseline(path=BASELINE_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_FILE):
+    # Merges into an existing baseline, so scales can be recorded one run
+    # at a time.
+    baseline = load_baseline(path) if os.path.exists(path) else {}
+    for scale, timings in results.items():
+        baseline.setdefault(scale, {}).update(timings)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
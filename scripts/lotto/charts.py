@@ -0,0 +1,153 @@
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+
+from .metrics import METRICS
+
+CHART_DPI = 150
+CHART_CACHE_BYTES = 64 * 1024 * 1024
+CHART_CACHE_ENTRIES = 512
+
+
+def _pyplot():
+    # matplotlib is only needed when a chart is actually drawn.
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def render_png(draw, *args, dpi=CHART_DPI):
+    # Draws a figure, returns it as PNG bytes and always closes it, so no
+    # figure outlives its render.
+    plt = _pyplot()
+    fig = draw(plt, *args)
+    try:
+        image = BytesIO()
+        fig.savefig(image, format='png', dpi=dpi, bbox_inches='tight')
+        return image.getvalue()
+    finally:
+        plt.close(fig)
+
+
+class ChartCache:
+    # Rendered chart images keyed by (chart, wheel, window, version) and
+    # evicted least recently used first once either the entry count or the
+    # total image size goes over its cap. Safe to share between sessions.
+
+    def __init__(self, max_bytes=CHART_CACHE_BYTES, max_entries=CHART_CACHE_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, key, draw, *args):
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        with METRICS.timer('lotto_chart_render_seconds', chart=draw.__name__):
+            image = render_png(draw, *args)
+        with self._lock:
+            if key not in self._images:
+                self._images[key] = image
+                self.size += len(image)
+            while len(self._images) > 1 and (self.size > self.max_bytes or len(self._images) > self.max_entries):
+                _, evicted = self._images.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+        return image
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self._images),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / requests if requests else 0.0,
+            }
+
+
+def frequency_chart(plt, counts, most_frequent, least_frequent, wheel, colors=None):
+    # Bars highlight the most and least frequent numbers, or take `colors`
+    # (one per number, as from heat_colors) when given.
+    fig, ax = plt.subplots(figsize=(12, 6))
+    if colors is not None:
+        ax.bar(range(1, 91), counts, color=list(colors), edgecolor='#bdbdbd', linewidth=0.5)
+    else:
+        bars = ax.bar(range(1, 91), counts, color='#1e88e5')
+        for i in np.flatnonzero(most_frequent):
+            bars[i].set_color('#4caf50')
+        for i in np.flatnonzero(least_frequent):
+            bars[i].set_color('#f44336')
+
+    ax.set_xlabel('Number')
+    ax.set_ylabel('Frequency')
+    ax.set_title(f'Number Frequency for Wheel {wheel}')
+    ax.set_xticks(range(1, 91, 5))
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    return fig
+
+
+def distribution_chart(plt, labels, percentages, color, title, ylabel, xlabel=None, label_offset=1, rotate=False):
+    # Bar chart of pattern shares with the percentage written above each bar.
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.bar(labels, percentages, color=color)
+    if xlabel:
+        ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    if rotate:
+        ax.tick_params(axis='x', labelrotation=45)
+
+    for i, v in enumerate(percentages):
+        ax.text(i, v + label_offset, f"{v:.1f}%", ha='center')
+    return fig
+
+
+def delay_chart(plt, numbers, delays, wheel):
+    fig, ax = plt.subplots(figsize=(12, 6))
+    colors = plt.cm.RdYlGn_r(delays / delays.max())
+    ax.bar(numbers, delays, color=colors)
+
+    ax.set_xlabel('Number')
+    ax.set_ylabel('Delay (days)')
+    ax.set_title(f'Number Delays for {wheel} Wheel')
+    ax.set_xticks(range(1, 91, 5))
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    return fig
+
+
+def delay_history_chart(plt, statistics, wheel):
+    fig, ax = plt.subplots(figsize=(12, 6))
+    numbers = statistics['number']
+    ax.bar(numbers, statistics['current_delay'].to_numpy(dtype=float, na_value=np.nan), color='#1e88e5', label='Current delay')
+    ax.scatter(numbers, statistics['max_delay'].to_numpy(dtype=float, na_value=np.nan), color='#f44336', marker='_', s=120, label='Max delay')
+    ax.scatter(numbers, statistics['p90_delay'], color='#ff9800', marker='_', s=120, label='90th percentile')
+
+    ax.set_xlabel('Number')
+    ax.set_ylabel('Delay (draws)')
+    ax.set_title(f'Current vs Historical Delays for {wheel} Wheel')
+    ax.set_xticks(range(1, 91, 5))
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    ax.legend()
+    return fig
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import sys
+import threading
+
+import pandas as pd
+
+from .api import API_HOST, API_PORT
+from .backtest import run_backtests, sweep
+from .bench import BASELINE_FILE, SCALES, TOLERANCE, compare, load_baseline, run_benchmarks, save_baseline
+from .cube import CountCube
+from .dataset import WHEELS
+from .delays import current_delays
+from .frequencies import FREQUENCY_WINDOW, frequency_tables, save_frequency_tables
+from .history import PartitionedHistory
+from .patterns import pattern_features, pattern_summary
+from .store import history_frame
+from .wheels import WheelViews
+from .workspace import (
+    DATA_DIR, data_path, ensure_dirs, load_cooccurrence, load_delay_statistics, load_presence, presence_file,
+)
+
+
+def frequency_export(presence, window):
+    # Counts of all 90 numbers over each wheel's last `window` draws.
+    cube = CountCube(presence)
+    rows = []
+    for wheel in cube.wheels:
+        if not cube.draw_count(wheel):
+            continue
+        counts, draws = cube.window(wheel, window)
+        rows.append(pd.DataFrame({'wheel': wheel, 'number': range(1, 91), 'frequency': counts, 'draws': draws}))
+    return pd.concat(rows, ignore_index=True)
+
+
+def delay_export(presence, version, data_dir):
+    statistics = load_delay_statistics(presence, version, data_dir).drop(columns='current_delay')
+    return current_delays(presence).merge(statistics, on=['wheel', 'number'], how='left')
+
+
+def pattern_export(lotto_data, window):
+    features = pattern_features(lotto_data)
+    views = WheelViews(features)
+    rows = []
+    for wheel in features['wheel'].unique():
+        summary = pattern_summary(views.tail(wheel, window))
+        row = {'wheel': wheel, 'draws': summary['total_draws']}
+        for key in ['odd_numbers', 'even_numbers', 'low_numbers', 'high_numbers', 'mean_sum', 'mean_spread']:
+            row[key] = summary[key]
+        for split, count in summary['odd_even_counts'].items():
+            row[f'odd_even_{split}'] = count
+        for split, count in summary['high_low_counts'].items():
+            row[f'low_high_{split}'] = count
+        for consecutive, count in summary['consecutive_distribution'].items():
+            row[f'consecutive_{consecutive}'] = count
+        for decade, share in summary['decade_distributions'].items():
+            row[f'decade_{decade}'] = share
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def command_refresh(args):
+    from .refresh import ARCHIVE_URL, refresh
+
+    new_draws = refresh(args.url or ARCHIVE_URL, args.data_dir, incremental=not args.full)
+    print(f"{new_draws} new draws" if new_draws else "Data is already up to date")
+
+
+def command_stats(args):
+    history = PartitionedHistory.open(args.data_dir)
+    lotto_data = history_frame(history.records())
+    version = history.version
+    save_frequency_tables(
+        *frequency_tables(lotto_data, args.window), stats_dir=data_path(args.data_dir, 'historical_stats')
+    )
+    presence = load_presence(history, args.data_dir)
+    load_cooccurrence(presence, args.data_dir)
+    load_delay_statistics(presence, version, args.data_dir)
+    print(f"Statistics updated for {len(lotto_data)} draws (dataset {version})")
+
+
+def command_export(args):
+    history = PartitionedHistory.open(args.data_dir)
+    if args.table == 'patterns':
+        table = pattern_export(history_frame(history.records()), args.window)
+    else:
+        presence = load_presence(history, args.data_dir)
+        if args.table == 'frequencies':
+            table = frequency_export(presence, args.window)
+        else:
+            table = delay_export(presence, history.version, args.data_dir)
+
+    output = sys.stdout if args.output == '-' else args.output
+    if args.format == 'json':
+        table.to_json(output, orient='records', date_format='iso', indent=None)
+    else:
+        table.to_csv(output, index=False)
+
+
+def command_backtest(args):
+    history = PartitionedHistory.open(args.data_dir)
+    presence = load_presence(history, args.data_dir)
+    wheels = args.wheel or [wheel for w, wheel in enumerate(presence.wheels) if presence.drawn[:, w].any()]
+    table = run_backtests(
+        sweep(wheels), presence, workers=args.workers, presence_file=presence_file(args.data_dir)
+    )
+    output = sys.stdout if args.output == '-' else args.output
+    if args.format == 'json':
+        table.to_json(output, orient='records', indent=None)
+    else:
+        table.to_csv(output, index=False)
+
+
+def command_serve(args):
+    from .api import serve
+
+    print(f"Serving on http://{args.host}:{args.port}/ (frequencies, delays, draws)")
+    serve(args.data_dir, args.host, args.port)
+
+
+def command_serve_archive(args):
+    from .download import serve_archive
+
+    archive = args.archive or data_path(args.data_dir, 'raw', 'lotto_historical.zip')
+    server = serve_archive(archive, args.host, args.port, args.rate, args.drop_after, args.fail_first)
+    print(f"Serving {archive} on http://{args.host}:{server.server_port}/{os.path.basename(archive)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+def command_bench(args):
+    # Compares against the baseline unless recording one, and fails before
+    # running anything when there is nothing to compare with.
+    baseline_file = args.baseline or BASELINE_FILE
+    if not args.save_baseline:
+        if not os.path.exists(baseline_file):
+            sys.exit(f"No baseline at {baseline_file}: record one with --save-baseline")
+        baseline = load_baseline(baseline_file)
+        missing = [str(scale) for scale in args.scale if str(scale) not in baseline]
+        if missing:
+            sys.exit(f"No baseline for scale {', '.join(missing)}x in {baseline_file}: record it with --save-baseline")
+
+    results = run_benchmarks(args.scale, repeat=args.repeat, only=args.stage)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        save_baseline(results, baseline_file)
+        print(f"Baseline saved to {baseline_file}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    for scale, stage, measure, previous, current in regressions:
+        print(f"REGRESSION {scale}x {stage} {measure}: {previous:.4g} -> {current:.4g} ({current / previous - 1:+.0%})")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions against {baseline_file}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='lotto', description="Lotto statistics without the web app.")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="data directory (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    refresh_parser = commands.add_parser('refresh', help="download new draws and update the history")
+    refresh_parser.add_argument('--full', action='store_true', help="rebuild the history from the whole archive")
+    refresh_parser.add_argument('--url', help="archive URL")
+    refresh_parser.set_defaults(handler=command_refresh)
+
+    stats_parser = commands.add_parser('stats', help="recompute the saved statistics")
+    stats_parser.add_argument('--window', type=int, default=FREQUENCY_WINDOW, help="draws per wheel for the frequency tables")
+    stats_parser.set_defaults(handler=command_stats)
+
+    export_parser = commands.add_parser('export', help="export a table for all wheels")
+    export_parser.add_argument('table', choices=['frequencies', 'delays', 'patterns'])
+    export_parser.add_argument('--window', type=int, default=FREQUENCY_WINDOW, help="draws per wheel (frequencies, patterns)")
+    export_parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+    export_parser.add_argument('-o', '--output', default='-', help="output file, - for stdout")
+    export_parser.set_defaults(handler=command_export)
+
+    backtest_parser = commands.add_parser('backtest', help="score the hot, cold and delay strategies on past draws")
+    backtest_parser.add_argument('--wheel', nargs='+', type=str.upper, choices=WHEELS, help="wheels (default: all)")
+    backtest_parser.add_argument('--workers', type=int, help="worker processes (default: one per core)")
+    backtest_parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+    backtest_parser.add_argument('-o', '--output', default='-', help="output file, - for stdout")
+    backtest_parser.set_defaults(handler=command_backtest)
+
+    serve_parser = commands.add_parser('serve', help="answer JSON queries over HTTP")
+    serve_parser.add_argument('--host', default=API_HOST)
+    serve_parser.add_argument('--port', type=int, default=API_PORT)
+    serve_parser.set_defaults(handler=command_serve)
+
+    archive_parser = commands.add_parser('serve-archive', help="serve an archive locally to test refreshes against")
+    archive_parser.add_argument('archive', nargs='?', help="zip to serve (default: the downloaded one)")
+    archive_parser.add_argument('--host', default='127.0.0.1')
+    archive_parser.add_argument('--port', type=int, default=8766)
+    archive_parser.add_argument('--rate', type=float, help="bytes per second to send at most")
+    archive_parser.add_argument('--drop-after', type=int, help="close every response after this many bytes")
+    archive_parser.add_argument('--fail-first', type=int, default=0, help="answer this many requests with 503 first")
+    archive_parser.set_defaults(handler=command_serve_archive)
+
+    bench_parser = commands.add_parser('bench', help="time each stage on synthetic histories, offline")
+    bench_parser.add_argument('--scale', type=int, nargs='+', default=SCALES, help="multiples of the real history size (default 1 10; 100 needs about 4 GB)")
+    bench_parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage, the best one counts")
+    bench_parser.add_argument('--stage', nargs='+', help="only time these stages")
+    bench_parser.add_argument('--baseline', help=f"baseline JSON (default: {BASELINE_FILE})")
+    bench_parser.add_argument('--save-baseline', action='store_true', help="record the results as the baseline")
+    bench_parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="allowed slowdown before failing")
+    bench_parser.add_argument('-o', '--output', help="also write the results to this JSON file")
+    bench_parser.set_defaults(handler=command_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    ensure_dirs(args.data_dir)
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
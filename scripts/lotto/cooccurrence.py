@@ -0,0 +1,129 @@
+from itertools import combinations
+
+import numpy as np
+
+from .presence import PresenceIndex
+
+PAIR_POSITIONS = np.array(list(combinations(range(5), 2)))
+TRIPLE_POSITIONS = np.array(list(combinations(range(5), 3)))
+UPPER_PAIRS = np.triu_indices(90, 1)
+
+_valid_triples = None
+
+
+def valid_triple_codes():
+    global _valid_triples
+    if _valid_triples is None:
+        a, b, c = np.array(list(combinations(range(90), 3))).T
+        _valid_triples = a * 8100 + b * 90 + c
+    return _valid_triples
+
+
+def decode_triples(codes):
+    return np.stack([codes // 8100, codes // 90 % 90, codes % 90], axis=1) + 1
+
+
+def draw_numbers(matrix):
+    # (n, 90) presence rows -> (n, 5) ascending numbers, 0 where missing.
+    rows, cols = np.nonzero(matrix)
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    numbers = np.zeros((len(matrix), 5), dtype=np.int32)
+    keep = rank < 5
+    numbers[rows[keep], rank[keep]] = cols[keep] + 1
+    return numbers
+
+
+def triple_codes(numbers):
+    triples = numbers[:, TRIPLE_POSITIONS].reshape(-1, 3)
+    triples = triples[(triples > 0).all(axis=1)] - 1
+    return triples[:, 0] * 8100 + triples[:, 1] * 90 + triples[:, 2]
+
+
+def _merge_counts(codes, counts, new_codes):
+    new_codes, new_counts = np.unique(new_codes, return_counts=True)
+    codes = np.concatenate([codes, new_codes])
+    counts = np.concatenate([counts, new_counts.astype(np.uint32)])
+    merged, inverse = np.unique(codes, return_inverse=True)
+    return merged, np.bincount(inverse, weights=counts, minlength=len(merged)).astype(np.uint32)
+
+
+class CooccurrenceIndex(PresenceIndex):
+    # Per-wheel ambo (pair) and terno (triple) counts over the full history.
+    # Pairs live in a dense 90x90 matrix per wheel; triples are kept sparse as
+    # sorted codes a*8100 + b*90 + c with their counts, so memory is bounded
+    # by the 117,480 possible terni per wheel. Window queries are answered
+    # from the presence array instead.
+
+    def __init__(self, presence, pairs=None, triples=None, last_date=None, digest=None):
+        super().__init__(presence, last_date, digest)
+        self.pairs = np.zeros((len(self.wheels), 90, 90), dtype=np.uint32) if pairs is None else pairs
+        self.triples = triples or [
+            (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint32)) for _ in self.wheels
+        ]
+
+    def _add(self, start):
+        matrix = self.presence.matrix[start:]
+        for w in range(len(self.wheels)):
+            rows = matrix[:, w]
+            rows = rows[rows.any(axis=1)]
+            if not len(rows):
+                continue
+            # float32 products go through BLAS and stay exact below 2**24.
+            x = rows.astype(np.float32)
+            self.pairs[w] += (x.T @ x).astype(np.uint32)
+            codes, counts = self.triples[w]
+            self.triples[w] = _merge_counts(codes, counts, triple_codes(draw_numbers(rows)))
+
+    def _arrays(self):
+        offsets = np.cumsum([0] + [len(codes) for codes, _ in self.triples])
+        return {
+            'pairs': self.pairs,
+            'triple_codes': np.concatenate([codes for codes, _ in self.triples]),
+            'triple_counts': np.concatenate([counts for _, counts in self.triples]),
+            'triple_offsets': offsets,
+        }
+
+    @classmethod
+    def _from_arrays(cls, presence, stored, last_date, digest):
+        offsets = stored['triple_offsets']
+        codes, counts = stored['triple_codes'], stored['triple_counts']
+        triples = [
+            (codes[lo:hi], counts[lo:hi]) for lo, hi in zip(offsets[:-1], offsets[1:])
+        ]
+        return cls(presence, stored['pairs'], triples, last_date, digest)
+
+    def _window_rows(self, wheel, last_n):
+        w = self.wheels.index(wheel)
+        rows = self.presence.matrix[:, w]
+        rows = rows[self.presence.drawn[:, w]]
+        return rows if last_n is None else rows[-last_n:]
+
+    def pair_counts(self, wheel, last_n=None):
+        if last_n is None:
+            return self.pairs[self.wheels.index(wheel)].astype(np.int64)
+        x = self._window_rows(wheel, last_n).astype(np.float32)
+        return (x.T @ x).astype(np.int64)
+
+    def ranked_pairs(self, wheel, k=10, last_n=None, largest=True):
+        counts = self.pair_counts(wheel, last_n)[UPPER_PAIRS]
+        order = np.argsort(-counts if largest else counts, kind='stable')[:k]
+        return np.stack(UPPER_PAIRS, axis=1)[order] + 1, counts[order]
+
+    def triple_counts(self, wheel, last_n=None):
+        # Sparse (codes, counts) of the terni seen in the window.
+        if last_n is None:
+            return self.triples[self.wheels.index(wheel)]
+        codes = triple_codes(draw_numbers(self._window_rows(wheel, last_n)))
+        codes, counts = np.unique(codes, return_counts=True)
+        return codes, counts
+
+    def ranked_triples(self, wheel, k=10, last_n=None, largest=True):
+        codes, counts = self.triple_counts(wheel, last_n)
+        if not largest:
+            # Terni never drawn together are the least frequent ones.
+            dense = np.zeros(90 ** 3, dtype=np.int64)
+            dense[codes] = counts
+            codes = valid_triple_codes()
+            counts = dense[codes]
+        order = np.argsort(-counts.astype(np.int64) if largest else counts, kind='stable')[:k]
+        return decode_triples(codes[order]), counts[order].astype(np.int64)
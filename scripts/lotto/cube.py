@@ -0,0 +1,56 @@
+import numpy as np
+
+
+class CountCube:
+    # Cumulative counts per date x wheel x number. Row i holds the counts of
+    # every draw before date index i, so any span of draws is one subtraction.
+
+    def __init__(self, presence):
+        self.dates = presence.dates
+        self.wheels = presence.wheels
+        matrix = presence.matrix
+        drawn = presence.drawn
+
+        dtype = np.uint16 if len(presence) < 2 ** 16 else np.int32
+        self.counts = np.zeros((len(presence) + 1,) + matrix.shape[1:], dtype=dtype)
+        np.cumsum(matrix, axis=0, dtype=dtype, out=self.counts[1:])
+        self.draws = np.zeros((len(presence) + 1, len(self.wheels)), dtype=np.int32)
+        np.cumsum(drawn, axis=0, out=self.draws[1:])
+        self.positions = [np.flatnonzero(drawn[:, w]) for w in range(len(self.wheels))]
+
+    def wheel_index(self, wheel):
+        return self.wheels.index(wheel)
+
+    def draw_count(self, wheel):
+        return len(self.positions[self.wheel_index(wheel)])
+
+    def _span(self, w, lo, hi):
+        counts = self.counts[hi, w].astype(np.int64) - self.counts[lo, w]
+        return counts, int(self.draws[hi, w] - self.draws[lo, w])
+
+    def window(self, wheel, last_n):
+        # Counts over the wheel's last `last_n` draws, plus how many draws
+        # the window actually covers.
+        w = self.wheel_index(wheel)
+        positions = self.positions[w]
+        if not len(positions):
+            return np.zeros(90, dtype=np.int64), 0
+        lo = positions[-min(last_n, len(positions))]
+        return self._span(w, lo, len(self.dates))
+
+    def between(self, wheel, start, end):
+        # Counts over the draws dated from `start` to `end`, both included.
+        w = self.wheel_index(wheel)
+        lo = np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left')
+        hi = np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right')
+        return self._span(w, lo, max(lo, hi))
+
+    def window_start(self, wheel, last_n):
+        positions = self.positions[self.wheel_index(wheel)]
+        return self.dates[positions[-min(last_n, len(positions))]]
+
+
+def rank_numbers(counts, k=10, largest=True):
+    # Numbers ordered by count, ties broken by the lower number.
+    order = np.argsort(-counts if largest else counts, kind='stable')[:k]
+    return order + 1, counts[order]
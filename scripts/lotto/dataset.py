@@ -0,0 +1,12 @@
+NUMBER_COLUMNS = ['n1', 'n2', 'n3', 'n4', 'n5']
+
+WHEELS = [
+    'BARI', 'CAGLIARI', 'FIRENZE', 'GENOVA', 'MILANO', 'NAPOLI',
+    'PALERMO', 'ROMA', 'TORINO', 'VENEZIA', 'NAZIONALE',
+]
+
+WHEEL_CODES = {
+    'BA': 'BARI', 'CA': 'CAGLIARI', 'FI': 'FIRENZE', 'GE': 'GENOVA',
+    'MI': 'MILANO', 'NA': 'NAPOLI', 'PA': 'PALERMO', 'RM': 'ROMA',
+    'TO': 'TORINO', 'VE': 'VENEZIA', 'RN': 'NAZIONALE',
+}
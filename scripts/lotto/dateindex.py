@@ -0,0 +1,75 @@
+import numpy as np
+
+
+def _day(date):
+    return np.datetime64(date, 'D')
+
+
+class DateIndex:
+    # The distinct dates of a column of draw dates in order, with offsets
+    # into its rows sorted by date: the rows of dates[i] are
+    # order[offsets[i]:offsets[i + 1]]. Every lookup is a binary search on
+    # the dates.
+
+    def __init__(self, dates):
+        days = np.asarray(dates).astype('datetime64[D]')
+        self.order = np.argsort(days, kind='stable')
+        self.dates, starts = np.unique(days[self.order], return_index=True)
+        self.offsets = np.append(starts, len(days))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def _span(self, lo, hi):
+        return self.order[self.offsets[lo]:self.offsets[max(lo, hi)]]
+
+    def position(self, date):
+        # Index of `date` in dates, or None if there was no draw that day.
+        i = np.searchsorted(self.dates, _day(date))
+        return int(i) if i < len(self.dates) and self.dates[i] == _day(date) else None
+
+    def __contains__(self, date):
+        return self.position(date) is not None
+
+    def rows(self, date):
+        # Row positions of the draws on `date`, all wheels.
+        i = self.position(date)
+        return self._span(i, i + 1) if i is not None else self.order[:0]
+
+    def between(self, start, end):
+        # Row positions of the draws dated from `start` to `end`, both
+        # included, in date order.
+        lo = np.searchsorted(self.dates, _day(start), side='left')
+        hi = np.searchsorted(self.dates, _day(end), side='right')
+        return self._span(lo, hi)
+
+    def previous(self, date):
+        # The last draw date before `date`, or None.
+        i = np.searchsorted(self.dates, _day(date), side='left')
+        return self.dates[i - 1].item() if i > 0 else None
+
+    def next(self, date):
+        # The first draw date after `date`, or None.
+        i = np.searchsorted(self.dates, _day(date), side='right')
+        return self.dates[i].item() if i < len(self.dates) else None
+
+    def last(self):
+        return self.dates[-1].item() if len(self.dates) else None
+
+    def _dates_within(self, start, end):
+        lo = np.searchsorted(self.dates, start, side='left')
+        hi = np.searchsorted(self.dates, end, side='left')
+        return self.dates[lo:hi]
+
+    def years(self):
+        return np.unique(self.dates.astype('datetime64[Y]')).astype(int) + 1970
+
+    def months(self, year):
+        start = np.datetime64(f'{year:04d}', 'M')
+        dates = self._dates_within(start, start + np.timedelta64(12, 'M'))
+        return np.unique(dates.astype('datetime64[M]') - start).astype(int) + 1
+
+    def days(self, year, month):
+        start = np.datetime64(f'{year:04d}-{month:02d}', 'D')
+        dates = self._dates_within(start, (start.astype('datetime64[M]') + 1).astype('datetime64[D]'))
+        return (dates - start).astype(int) + 1
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+
+def current_delays(presence, today=None):
+    if today is None:
+        today = pd.Timestamp.now().floor('D')
+
+    columns = ['wheel', 'number', 'last_date', 'delay_days', 'delay_draws']
+    if len(presence) == 0:
+        return pd.DataFrame(columns=columns)
+
+    matrix = presence.matrix
+    drawn = presence.drawn
+    wheels = np.flatnonzero(drawn.any(axis=0))
+
+    # Number of draws each wheel has had up to and including every date.
+    draw_number = np.cumsum(drawn, axis=0)
+    last = len(presence) - 1 - np.argmax(matrix[::-1], axis=0)
+    ever = matrix.any(axis=0)
+    delay_draws = draw_number[-1][:, None] - draw_number[last, np.arange(len(presence.wheels))[:, None]]
+
+    last, ever, delay_draws = last[wheels].ravel(), ever[wheels].ravel(), delay_draws[wheels].ravel()
+    last_date = np.where(ever, presence.dates[last], np.datetime64('NaT'))
+
+    delays = pd.DataFrame({
+        'wheel': np.repeat(np.asarray(presence.wheels)[wheels], 90),
+        'number': np.tile(np.arange(1, 91), len(wheels)),
+        'last_date': last_date.astype('datetime64[s]'),
+    })
+    delays['delay_days'] = (today - delays['last_date']).dt.days.astype('Int64')
+    delays['delay_draws'] = pd.arrays.IntegerArray(delay_draws.astype(np.int64), ~ever)
+    return delays[columns]
+
+
+class DelayHistory:
+    # Every gap (draws without the number) between consecutive appearances
+    # of each wheel x number over the whole history. Gaps are stored sorted
+    # per group in one flat array, group g = wheel * 90 + (number - 1)
+    # spanning gaps[offsets[g]:offsets[g + 1]].
+
+    PERCENTILES = [50, 90, 99]
+
+    def __init__(self, wheels, gaps, offsets, appearances, current):
+        self.wheels = list(wheels)
+        self.gaps = gaps
+        self.offsets = offsets
+        self.appearances = appearances
+        self.current = current
+
+    @classmethod
+    def from_presence(cls, presence):
+        drawn = presence.drawn
+        draw_number = np.cumsum(drawn, axis=0) - 1
+        groups = len(presence.wheels) * 90
+
+        # Transposed to wheel x number x date, nonzero comes out grouped by
+        # wheel and number with dates ascending.
+        w, n, d = np.nonzero(presence.matrix.transpose(1, 2, 0))
+        group = w * 90 + n
+        index = draw_number[d, w]
+
+        same = group[1:] == group[:-1]
+        gap_group = group[1:][same]
+        gaps = (np.diff(index) - 1)[same]
+        order = np.lexsort((gaps, gap_group))
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(gap_group, minlength=groups))])
+
+        appearances = np.bincount(group, minlength=groups)
+        last_index = np.full(groups, -1)
+        last_index[group] = index
+        total = drawn.sum(axis=0)
+        current = np.where(appearances > 0, np.repeat(total, 90) - 1 - last_index, -1)
+        return cls(presence.wheels, gaps[order].astype(np.int32), offsets, appearances, current)
+
+    def save(self, path, version=''):
+        np.savez(
+            path, wheels=np.array(self.wheels), gaps=self.gaps, offsets=self.offsets,
+            appearances=self.appearances, current=self.current, version=np.array(version),
+        )
+
+    @classmethod
+    def load(cls, path, version=None):
+        # Returns None when the stored gaps belong to another dataset version.
+        with np.load(path) as stored:
+            if version is not None and str(stored['version']) != version:
+                return None
+            return cls(
+                stored['wheels'].tolist(), stored['gaps'], stored['offsets'],
+                stored['appearances'], stored['current'],
+            )
+
+    def gaps_of(self, wheel, number):
+        g = self.wheels.index(wheel) * 90 + number - 1
+        return self.gaps[self.offsets[g]:self.offsets[g + 1]]
+
+    def _percentile(self, q):
+        # Linear interpolation between the sorted gaps of each group, like
+        # np.percentile's default method.
+        counts = np.diff(self.offsets)
+        if not len(self.gaps):
+            return np.full(len(counts), np.nan)
+        position = self.offsets[:-1] + q / 100 * np.maximum(counts - 1, 0)
+        lo = np.minimum(np.floor(position).astype(np.int64), len(self.gaps) - 1)
+        hi = np.minimum(lo + 1, np.maximum(self.offsets[1:] - 1, 0))
+        values = self.gaps[lo] + (self.gaps[hi] - self.gaps[lo]) * (position - lo)
+        return np.where(counts > 0, values, np.nan)
+
+    def statistics(self):
+        counts = np.diff(self.offsets)
+        has_gaps = counts > 0
+        sums = np.add.reduceat(self.gaps, self.offsets[:-1][has_gaps]) if len(self.gaps) else []
+        mean = np.full(len(counts), np.nan)
+        mean[has_gaps] = np.asarray(sums) / counts[has_gaps]
+        maximum = np.full(len(counts), -1)
+        maximum[has_gaps] = self.gaps[self.offsets[1:][has_gaps] - 1]
+
+        # Share of past gaps shorter than the current delay; groups are
+        # shifted apart so one searchsorted serves every wheel and number.
+        span = int(max(self.gaps.max(initial=0), self.current.max(initial=0))) + 1
+        group_of_gap = np.repeat(np.arange(len(counts)), counts)
+        keys = group_of_gap.astype(np.int64) * span + self.gaps
+        current_keys = np.arange(len(counts), dtype=np.int64) * span + np.maximum(self.current, 0)
+        shorter = np.searchsorted(keys, current_keys, side='left') - self.offsets[:-1]
+
+        drawn = self.appearances > 0
+        statistics = pd.DataFrame({
+            'wheel': np.repeat(self.wheels, 90),
+            'number': np.tile(np.arange(1, 91), len(self.wheels)),
+            'appearances': self.appearances,
+            'current_delay': pd.arrays.IntegerArray(np.maximum(self.current, 0), ~drawn),
+            'max_delay': pd.arrays.IntegerArray(np.maximum(maximum, 0), ~has_gaps),
+            'mean_delay': mean,
+        })
+        for q in self.PERCENTILES:
+            statistics[f'p{q}_delay'] = self._percentile(q)
+        statistics['current_percentile'] = np.where(
+            has_gaps & drawn, 100 * shorter / np.maximum(counts, 1), np.nan
+        )
+        statistics['current_vs_max'] = np.where(
+            has_gaps & drawn & (maximum > 0), self.current / np.maximum(maximum, 1), np.nan
+        )
+        active = self.appearances.reshape(-1, 90).any(axis=1)
+        return statistics[np.repeat(active, 90)].reset_index(drop=True)
@@ -0,0 +1,305 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import zipfile
+import zlib
+from email.utils import formatdate
+
+from .metrics import METRICS
+from .parser import ARCHIVE_MEMBER
+from .store import StagedFiles, replace_file
+
+DOWNLOAD_CHUNK = 64 * 1024
+# (connect, read) seconds: a stalled transfer fails after the read timeout
+# and is resumed, instead of hanging the refresh.
+DOWNLOAD_TIMEOUT = (10, 30)
+# Consecutive attempts that got no new bytes before giving up.
+DOWNLOAD_ATTEMPTS = 5
+BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class DownloadError(OSError):
+    pass
+
+
+class TransientError(DownloadError):
+    # A failure worth retrying: a dropped or short transfer, a busy server.
+    pass
+
+
+def _no_progress(phase, done=None):
+    pass
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _validators(headers):
+    return {'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+
+
+def _if_range(validators):
+    # If-Range needs a strong validator; a weak ETag cannot be used.
+    etag = validators.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return validators.get('last_modified')
+
+
+def _content_range(value):
+    # (first byte, total size or None) from "bytes 100-199/1000".
+    try:
+        span, _, total = value.partition(' ')[2].partition('/')
+        return int(span.split('-')[0]), None if total == '*' else int(total)
+    except (AttributeError, ValueError):
+        return None, None
+
+
+def verify_archive(path):
+    # True if `path` is a complete zip that holds the archive member and
+    # whose members all match their CRCs.
+    try:
+        with zipfile.ZipFile(path) as zip_ref:
+            return ARCHIVE_MEMBER in zip_ref.namelist() and zip_ref.testzip() is None
+    except (zipfile.BadZipFile, zlib.error, EOFError, OSError):
+        return False
+
+
+def save_validators(meta_file, validators, staged=None):
+    # Until they are saved, the next fetch downloads the archive again
+    # rather than being told it is unchanged. With `staged` they are
+    # swapped in on its commit.
+    if staged is None:
+        replace_file(meta_file, lambda f: f.write(json.dumps(validators).encode()))
+        return
+    with open(staged.stage(meta_file), 'w') as f:
+        json.dump(validators, f)
+
+
+class Downloader:
+    # Fetches the archive over one pooled requests session, kept for the
+    # life of the Downloader so that refreshes reuse its connections. The
+    # body is streamed to a .part file next to the archive; a transfer that
+    # drops or stalls is resumed where it stopped with a Range request
+    # (If-Range makes the server send the whole file instead if it changed
+    # meanwhile) after an exponential backoff, and the archive is only
+    # swapped in once the .part file opens as a zip with matching CRCs.
+
+    def __init__(self, attempts=DOWNLOAD_ATTEMPTS, backoff=BACKOFF_SECONDS, timeout=DOWNLOAD_TIMEOUT,
+                 chunk_size=DOWNLOAD_CHUNK, sleep=time.sleep):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.sleep = sleep
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def _retryable(self):
+        import requests
+
+        return (TransientError, requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+    def fetch(self, url, archive_file, meta_file, progress=_no_progress, save=True):
+        # Returns None when the server reports the archive unchanged since
+        # the one on disk, else the validators (ETag, Last-Modified) of the
+        # new, verified archive now in place. They are saved to meta_file
+        # unless save=False, for callers that save them only once they are
+        # done with the archive (see save_validators).
+        part_file = archive_file + '.part'
+        part_meta = part_file + '.json'
+        validators = _read_json(meta_file) if os.path.exists(archive_file) else {}
+        retryable = self._retryable()
+
+        failures = 0
+        while True:
+            size = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+            try:
+                complete = self._transfer(url, part_file, part_meta, validators, progress)
+                if complete is None:
+                    _remove(part_file, part_meta)
+                    return None
+                if not verify_archive(part_file):
+                    _remove(part_file, part_meta)
+                    METRICS.increment('lotto_download_corrupt_total')
+                    raise TransientError("the downloaded archive is not a valid zip")
+                break
+            except retryable as error:
+                grew = os.path.exists(part_file) and os.path.getsize(part_file) > size
+                failures = 1 if grew else failures + 1
+                if failures >= self.attempts:
+                    raise DownloadError(f"download failed after {failures} attempts without progress: {error}") from error
+                METRICS.increment('lotto_download_retries_total')
+                delay = min(self.backoff * 2 ** (failures - 1), MAX_BACKOFF_SECONDS)
+                self.sleep(delay * random.uniform(0.5, 1.0))
+
+        with StagedFiles() as staged:
+            os.replace(part_file, staged.stage(archive_file))
+            if save:
+                save_validators(meta_file, complete, staged)
+            staged.commit()
+        _remove(part_meta)
+        return complete
+
+    def _transfer(self, url, part_file, part_meta, validators, progress):
+        # One request, appending to part_file when it holds the start of the
+        # current version of the archive. Returns the archive's validators
+        # once the whole body is on disk, or None if it was not modified.
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        resume = _read_json(part_meta) if offset else {}
+        headers = {}
+        if offset and _if_range(resume):
+            headers['Range'] = f'bytes={offset}-'
+            headers['If-Range'] = _if_range(resume)
+        else:
+            offset = 0
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            status = response.status_code
+            if status == 304 and not offset:
+                return None
+            if status == 416:
+                # The partial file is not a prefix of the current archive.
+                _remove(part_file, part_meta)
+                raise TransientError("the server refused to resume the download")
+            if status in RETRY_STATUSES:
+                raise TransientError(f"HTTP {status} from {url}")
+            response.raise_for_status()
+
+            length = int(response.headers.get('Content-Length') or 0)
+            if status == 206:
+                first, total = _content_range(response.headers.get('Content-Range'))
+                if first != offset:
+                    _remove(part_file, part_meta)
+                    raise TransientError("the server resumed from the wrong offset")
+                total = total or (offset + length if length else None)
+                METRICS.increment('lotto_download_resumed_total')
+            else:
+                # A full response: the archive changed or Range is unsupported.
+                offset = 0
+                total = length or None
+                resume = _validators(response.headers)
+                with open(part_meta, 'w') as f:
+                    json.dump(resume, f)
+
+            received = offset
+            with open(part_file, 'ab' if offset else 'wb') as f:
+                for block in response.iter_content(self.chunk_size):
+                    f.write(block)
+                    received += len(block)
+                    METRICS.increment('lotto_download_bytes_total', len(block))
+                    progress('download', received / total if total else None)
+            if total and received < total:
+                raise TransientError(f"the connection closed after {received} of {total} bytes")
+        return resume
+
+
+def serve_archive(path, host='127.0.0.1', port=0, rate=None, drop_after=None, fail_first=0):
+    # A local stand-in for the archive server, to exercise the downloader:
+    # it answers conditional and Range requests for the file at `path`,
+    # sends at most `rate` bytes a second, cuts every response off after
+    # `drop_after` bytes of body and answers the first `fail_first`
+    # requests with 503. Runs in a daemon thread and returns the server,
+    # whose `requests` list records the headers of each request.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    with open(path, 'rb') as f:
+        body = f.read()
+    etag = '"%s"' % hashlib.sha1(body).hexdigest()
+    last_modified = formatdate(os.path.getmtime(path), usegmt=True)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            server.requests.append(dict(self.headers))
+            if len(server.requests) <= fail_first:
+                self.send_error(503)
+                return
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+
+            start = 0
+            ranged = self.headers.get('Range', '')
+            if ranged.startswith('bytes=') and self.headers.get('If-Range', etag) in (etag, last_modified):
+                start = int(ranged[len('bytes='):].split('-')[0] or 0)
+                if start >= len(body):
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{len(body)}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+            else:
+                self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Length', str(len(body) - start))
+            self.end_headers()
+
+            remaining = body[start:] if drop_after is None else body[start:start + drop_after]
+            block_size = DOWNLOAD_CHUNK if rate is None else max(1, min(DOWNLOAD_CHUNK, int(rate) // 10))
+            try:
+                for i in range(0, len(remaining), block_size):
+                    self.wfile.write(remaining[i:i + block_size])
+                    if rate is not None:
+                        time.sleep(block_size / rate)
+            except ConnectionError:
+                # The client gave up (a read timeout, say).
+                self.close_connection = True
+                return
+            if drop_after is not None and start + drop_after < len(body):
+                self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, name='lotto-archive', daemon=True).start()
+    return server
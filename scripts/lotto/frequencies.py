@@ -0,0 +1,47 @@
+import os
+
+from .dataset import NUMBER_COLUMNS
+from .store import StagedFiles, save_stats
+
+FREQUENCY_WINDOW = 100
+
+
+def frequency_tables(lotto_data, window=FREQUENCY_WINDOW):
+    lotto_data = lotto_data.assign(wheel=lotto_data['wheel'].astype(str))
+    last_extractions = lotto_data.groupby('wheel').tail(window)
+    frequencies = last_extractions.melt(
+        id_vars=['wheel'],
+        value_vars=NUMBER_COLUMNS,
+        var_name='num_pos',
+        value_name='number'
+    ).groupby(['wheel', 'number']).size().reset_index(name='frequency')
+
+    # Stable sorts keep ties in number order, like nlargest/nsmallest per wheel.
+    most_frequent = frequencies.sort_values(
+        ['wheel', 'frequency'], ascending=[True, False], kind='stable'
+    ).groupby('wheel').head(10).reset_index(drop=True)
+
+    least_frequent = frequencies.sort_values(
+        ['wheel', 'frequency'], ascending=[True, True], kind='stable'
+    ).groupby('wheel').head(10).reset_index(drop=True)
+
+    return frequencies, most_frequent, least_frequent
+
+
+def save_frequency_tables(frequencies, most_frequent, least_frequent, stats_dir='data/historical_stats', staged=None):
+    # Written through temporary files; with `staged` the swap into place is
+    # left to the caller's commit(), otherwise it happens here.
+    if staged is None:
+        with StagedFiles() as staged:
+            save_frequency_tables(frequencies, most_frequent, least_frequent, stats_dir, staged)
+            staged.commit()
+        return
+
+    tables = {
+        'most_frequent': most_frequent,
+        'least_frequent': least_frequent,
+        'numbers_frequency': frequencies,
+    }
+    for name, table in tables.items():
+        save_stats(staged.stage(os.path.join(stats_dir, f'{name}.npy')), table)
+        table.to_csv(staged.stage(os.path.join(stats_dir, f'{name}.csv')), index=False)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from .presence import PresenceIndex
+
+# In draws of the wheel: an appearance this many draws ago weighs half as
+# much as one in the latest draw.
+HALF_LIVES = (10, 25, 50, 100)
+
+
+class HeatIndex(PresenceIndex):
+    # Exponentially decayed appearance counts per half-life x wheel x
+    # number. Each draw of a wheel multiplies its scores by 0.5 ** (1 / h)
+    # and adds 1 for every number drawn, so a score counts an appearance k
+    # draws ago as 0.5 ** (k / h). Extending it with newer draws costs O(90)
+    # per draw and half-life.
+
+    def __init__(self, presence, half_lives=HALF_LIVES, scores=None, last_date=None, digest=None):
+        super().__init__(presence, last_date, digest)
+        self.half_lives = tuple(int(h) for h in half_lives)
+        self.decay = 0.5 ** (1 / np.asarray(self.half_lives, dtype=np.float64))
+        if scores is None:
+            scores = np.zeros((len(self.half_lives), len(self.wheels), 90))
+        self.scores = scores
+
+    def _add(self, start):
+        matrix = self.presence.matrix[start:]
+        drawn = self.presence.drawn[start:]
+        for w in range(len(self.wheels)):
+            rows = matrix[drawn[:, w], w]
+            if not len(rows):
+                continue
+            # n new draws: the old scores decay n times and the draw r
+            # places before the newest one is added with weight decay ** r.
+            weights = self.decay[:, None] ** np.arange(len(rows) - 1, -1, -1)
+            self.scores[:, w] = self.scores[:, w] * self.decay[:, None] ** len(rows) + weights @ rows
+
+    def reusable(self, half_lives=HALF_LIVES):
+        return super().reusable() and self.half_lives == tuple(int(h) for h in half_lives)
+
+    def scores_for(self, wheel, half_life):
+        return self.scores[self.half_lives.index(half_life), self.wheels.index(wheel)]
+
+    def _arrays(self):
+        return {'half_lives': np.array(self.half_lives), 'scores': self.scores}
+
+    @classmethod
+    def _from_arrays(cls, presence, stored, last_date, digest):
+        return cls(presence, stored['half_lives'], stored['scores'], last_date, digest)
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .dataset import WHEELS
+from .dateindex import DateIndex
+from .store import HISTORY_DTYPE, StagedFiles, append_history, frame_to_records, migrate_csv, read_history
+
+HISTORY_DIR = os.path.join('processed', 'history')
+MANIFEST_FILE = 'manifest.json'
+PARTITION_NAME = re.compile(r'^\d+\.bin$')
+# A Dataset keeps the partitions holding this many latest draws of every
+# wheel in memory; older ones are read when a query reaches them.
+RECENT_DRAWS = 1000
+
+
+class StalePartitionError(RuntimeError):
+    # A partition file no longer holds what this history's manifest says,
+    # after a full refresh rewrote or removed it.
+    pass
+
+
+def history_dir(data_dir):
+    return os.path.join(data_dir, HISTORY_DIR)
+
+
+def record_years(records):
+    return records['date'].astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+def partition_entry(year, records):
+    # What the manifest knows about one partition, so that picking
+    # partitions never needs to read them.
+    records = np.ascontiguousarray(records)
+    return {
+        'year': int(year),
+        'file': f'{year}.bin',
+        'rows': len(records),
+        'first_date': int(records['date'].min()) if len(records) else None,
+        'last_date': int(records['date'].max()) if len(records) else None,
+        'draws': np.bincount(records['wheel'], minlength=len(WHEELS))[:len(WHEELS)].tolist(),
+        'sha1': hashlib.sha1(records.tobytes()).hexdigest(),
+    }
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'partitions': []}
+    with open(path) as f:
+        return json.load(f)
+
+
+class PartitionedHistory:
+    # The draw history as one file of HISTORY_DTYPE records per year plus a
+    # JSON manifest listing them. Partitions are memory-mapped on first use
+    # and cut to the manifest's row count, so a Dataset opened before a
+    # refresh appended to the current year keeps seeing its own version.
+    # Their hash is checked against the manifest, so one opened before a
+    # full refresh rewrote the files raises instead of mixing versions.
+
+    def __init__(self, directory, manifest=None, paths=None):
+        self.directory = directory
+        manifest = read_manifest(directory) if manifest is None else manifest
+        self.partitions = sorted(manifest['partitions'], key=lambda entry: entry['year'])
+        self._entries = {entry['year']: entry for entry in self.partitions}
+        self._paths = paths or {}
+        self._loaded = {}
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, data_dir):
+        migrate_history(data_dir)
+        return cls(history_dir(data_dir))
+
+    def __len__(self):
+        return sum(entry['rows'] for entry in self.partitions)
+
+    def __contains__(self, year):
+        return year in self._entries
+
+    @property
+    def version(self):
+        # Hash of the partition hashes: the same content gives the same
+        # version without reading any partition.
+        hashes = ''.join(f"{entry['year']}:{entry['sha1']};" for entry in self.partitions)
+        return hashlib.sha1(hashes.encode()).hexdigest()[:12]
+
+    @property
+    def last_date(self):
+        return self.partitions[-1]['last_date'] if self.partitions else None
+
+    @property
+    def draw_counts(self):
+        # Draws of each wheel over the whole history, in WHEELS order, from
+        # the manifest.
+        if not self.partitions:
+            return np.zeros(len(WHEELS), dtype=np.int64)
+        return np.sum([entry['draws'] for entry in self.partitions], axis=0)
+
+    @property
+    def loaded_years(self):
+        return sorted(self._loaded)
+
+    def path(self, year):
+        return self._paths.get(year) or os.path.join(self.directory, self._entries[year]['file'])
+
+    def partition(self, year):
+        records = self._loaded.get(year)
+        if records is None:
+            with self._lock:
+                records = self._loaded.get(year)
+                if records is None:
+                    entry = self._entries[year]
+                    records = read_history(self.path(year))[:entry['rows']]
+                    if hashlib.sha1(np.ascontiguousarray(records)).hexdigest() != entry['sha1']:
+                        raise StalePartitionError(
+                            f"{self.path(year)} was rewritten since this history version was read; load it again"
+                        )
+                    self._loaded[year] = records
+        return records
+
+    def date_index(self, year):
+        # DateIndex over the rows of one partition, built on first use.
+        index = self._indexes.get(year)
+        if index is None:
+            records = self.partition(year)
+            with self._lock:
+                index = self._indexes.get(year)
+                if index is None:
+                    index = self._indexes[year] = DateIndex(records['date'].astype('datetime64[D]'))
+        return index
+
+    def records(self, first_year=None, last_year=None):
+        years = [
+            entry['year'] for entry in self.partitions
+            if (first_year is None or entry['year'] >= first_year) and (last_year is None or entry['year'] <= last_year)
+        ]
+        if not years:
+            return np.empty(0, dtype=HISTORY_DTYPE)
+        return np.concatenate([self.partition(year) for year in years])
+
+    def recent_year(self, draws):
+        # First year of the fewest newest partitions holding the last `draws`
+        # draws of every wheel (all of a wheel's draws if it has fewer).
+        if not self.partitions:
+            return None
+        needed = np.minimum(self.draw_counts, draws)
+        held = np.zeros(len(WHEELS), dtype=np.int64)
+        for entry in reversed(self.partitions):
+            held += entry['draws']
+            if (held >= needed).all():
+                return entry['year']
+        return self.partitions[0]['year']
+
+    def tail(self, draws):
+        year = self.recent_year(draws)
+        return self.records(first_year=year) if year is not None else np.empty(0, dtype=HISTORY_DTYPE)
+
+    def between(self, start, end):
+        # Records dated from `start` to `end`, both included, in date order:
+        # a binary search in the date index of each year in between.
+        first = int(np.datetime64(start, 'D').astype('datetime64[Y]').astype(np.int64)) + 1970
+        last = int(np.datetime64(end, 'D').astype('datetime64[Y]').astype(np.int64)) + 1970
+        spans = [
+            self.partition(entry['year'])[self.date_index(entry['year']).between(start, end)]
+            for entry in self.partitions if first <= entry['year'] <= last
+        ]
+        return np.concatenate(spans) if spans else np.empty(0, dtype=HISTORY_DTYPE)
+
+
+class PartitionWriter:
+    # Appends records to staged copies of the partitions of their years and
+    # stages the new manifest last, so committing the StagedFiles swaps the
+    # manifest in after every partition it lists.
+
+    def __init__(self, history, staged, fresh=False):
+        self.history = history
+        self.staged = staged
+        self.fresh = fresh
+        self._paths = {}
+
+    def append(self, records):
+        years = record_years(records)
+        for year in np.unique(years).tolist():
+            path = self._paths.get(year)
+            if path is None:
+                target = os.path.join(self.history.directory, f'{year}.bin')
+                path = self._paths[year] = self.staged.stage(target, copy=not self.fresh and year in self.history)
+                if not os.path.exists(path):
+                    open(path, 'wb').close()
+            append_history(path, records[years == year])
+
+    def finish(self):
+        # Stages the manifest and returns the new history, read from the
+        # staged files until they are committed.
+        entries = {} if self.fresh else {entry['year']: entry for entry in self.history.partitions}
+        for year, path in self._paths.items():
+            entries[year] = partition_entry(year, read_history(path, mmap=False))
+        manifest = {'partitions': [entries[year] for year in sorted(entries)]}
+        with open(self.staged.stage(os.path.join(self.history.directory, MANIFEST_FILE)), 'w') as f:
+            # One line per partition keeps the manifest readable and diffable.
+            f.write('{"partitions": [\n' + ',\n'.join(json.dumps(entry) for entry in manifest['partitions']) + '\n]}\n')
+        return PartitionedHistory(self.history.directory, manifest, paths=dict(self._paths))
+
+
+def remove_stale_partitions(directory):
+    # Partition files the manifest no longer lists (after a full rebuild).
+    listed = {entry['file'] for entry in read_manifest(directory)['partitions']}
+    for name in os.listdir(directory):
+        if PARTITION_NAME.match(name) and name not in listed:
+            os.remove(os.path.join(directory, name))
+
+
+def migrate_history(data_dir):
+    # Splits the single-file history, or failing that the CSV export, into
+    # year partitions the first time a partitioned history is opened.
+    migrate_csv(data_dir)
+    directory = history_dir(data_dir)
+    if os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+        return
+    legacy_file = os.path.join(data_dir, 'processed', 'lotto_historical.bin')
+    history_csv = os.path.join(data_dir, 'processed', 'lotto_historical.csv')
+    if os.path.exists(legacy_file):
+        records = read_history(legacy_file, mmap=False)
+    elif os.path.exists(history_csv):
+        records = frame_to_records(pd.read_csv(history_csv))
+    else:
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    with StagedFiles() as staged:
+        writer = PartitionWriter(PartitionedHistory(directory, {'partitions': []}), staged, fresh=True)
+        writer.append(records)
+        writer.finish()
+        staged.commit()
@@ -0,0 +1,156 @@
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+from .store import replace_file
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in key) + '}'
+
+
+class Metrics:
+    # Process-wide timings, counters and gauges. Timings keep count, total,
+    # max and last duration per name and label set, and everything can be
+    # exported in the Prometheus text format.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            count, total, longest, _ = self._timings.get(key, (0, 0.0, 0.0, 0.0))
+            self._timings[key] = (count + 1, total + seconds, max(longest, seconds), seconds)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def timings(self):
+        # [(name, labels, count, total, max, last)] sorted by total time.
+        with self._lock:
+            rows = [(name, dict(key), *values) for (name, key), values in self._timings.items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def values(self):
+        with self._lock:
+            return (
+                [(name, dict(key), value) for (name, key), value in self._counters.items()],
+                [(name, dict(key), value) for (name, key), value in self._gauges.items()],
+            )
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            timings = sorted(self._timings.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        previous = None
+        for (name, key), (count, total, longest, _) in timings:
+            if name != previous:
+                header(name, 'summary')
+                previous = name
+            lines.append(f"{name}_count{_format_labels(key)} {count}")
+            lines.append(f"{name}_sum{_format_labels(key)} {total:.6f}")
+        previous = None
+        for (name, key), (_, _, longest, _) in timings:
+            if name != previous:
+                header(f"{name}_max", 'gauge')
+                previous = name
+            lines.append(f"{name}_max{_format_labels(key)} {longest:.6f}")
+        for kind, values in [('counter', counters), ('gauge', gauges)]:
+            previous = None
+            for (name, key), value in values:
+                if name != previous:
+                    header(name, kind)
+                    previous = name
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        # Atomic, so a node_exporter textfile collector never reads half a file.
+        text = self.prometheus_text().encode()
+        replace_file(path, lambda f: f.write(text))
+
+    def serve(self, port, host='127.0.0.1'):
+        # Serves the Prometheus text on http://host:port/metrics from a
+        # daemon thread and returns the server.
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='lotto-metrics', daemon=True).start()
+        return server
+
+
+def profile_call(func, *args, limit=30, **kwargs):
+    # Runs func under cProfile. Returns the top `limit` functions by
+    # cumulative time as text and the raw stats in the .prof format that
+    # pstats and snakeviz read.
+    profiler = cProfile.Profile()
+    profiler.runcall(func, *args, **kwargs)
+    profiler.create_stats()
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(limit)
+    return {'text': text.getvalue(), 'data': marshal.dumps(profiler.stats), 'finished': time.time()}
+
+
+METRICS = Metrics()
+METRICS.describe('lotto_stage_seconds', "Time spent computing or rendering one stage.")
+METRICS.describe('lotto_refresh_phase_seconds', "Time spent in each phase of a data refresh.")
+METRICS.describe('lotto_download_retries_total', "Archive download attempts retried after a failure.")
+METRICS.describe('lotto_download_resumed_total', "Archive downloads resumed with a Range request.")
+METRICS.describe('lotto_chart_render_seconds', "Time spent drawing a chart on a cache miss.")
@@ -0,0 +1,76 @@
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from .dataset import NUMBER_COLUMNS, WHEEL_CODES, WHEELS
+
+ARCHIVE_MEMBER = 'storico01-oggi.txt'
+CHUNK_LINES = 64 * 1024
+
+WHEEL_INDEX = {code: WHEELS.index(wheel) for code, wheel in WHEEL_CODES.items()}
+UNKNOWN_WHEEL = 255
+
+
+def parse_dates(values):
+    # numpy parses ISO dates without pandas' nanosecond range limit (years
+    # 1677-2262), which long synthetic histories go past.
+    dates = values.str.replace('/', '-', regex=False).to_numpy(dtype='datetime64[D]')
+    return dates.astype(np.int32)
+
+
+def format_dates(days):
+    dates = np.datetime_as_string(np.asarray(days).astype('datetime64[D]'))
+    return np.char.replace(dates, '-', '/').astype(object)
+
+
+def read_archive_chunks(archive_file, after=None, chunk_lines=CHUNK_LINES):
+    # Streams the archive member straight out of the zip and yields typed
+    # columns: date as days since epoch (int32), wheel as an index into
+    # WHEELS (uint8) and the five numbers as an (n, 5) uint8 array where 0
+    # marks a missing number. Lines with an unknown wheel code are skipped.
+    # Default NA parsing is off because NA is the code for NAPOLI.
+    columns = ['date', 'wheel'] + NUMBER_COLUMNS
+    with zipfile.ZipFile(archive_file, 'r') as zip_ref, zip_ref.open(ARCHIVE_MEMBER) as member:
+        reader = pd.read_csv(
+            member, sep='\t', header=None, names=columns,
+            dtype={'date': str, 'wheel': 'category'}, chunksize=chunk_lines,
+            keep_default_na=False, na_values={column: [''] for column in NUMBER_COLUMNS}
+        )
+        for chunk in reader:
+            dates = parse_dates(chunk['date'])
+
+            # Only the chunk's distinct codes go through the dict; rows are
+            # mapped with one take. The trailing entry catches missing codes.
+            wheel = chunk['wheel'].array
+            lookup = np.array(
+                [WHEEL_INDEX.get(code, UNKNOWN_WHEEL) for code in wheel.categories] + [UNKNOWN_WHEEL],
+                dtype=np.uint8
+            )
+            wheels = lookup[wheel.codes]
+
+            keep = wheels != UNKNOWN_WHEEL
+            if after is not None:
+                keep &= dates > after
+            if not keep.any():
+                continue
+
+            numbers = chunk[NUMBER_COLUMNS].to_numpy(dtype=float)[keep]
+            numbers = np.where((numbers >= 1) & (numbers <= 90), numbers, 0).astype(np.uint8)
+
+            yield {
+                'date': dates[keep],
+                'wheel': wheels[keep],
+                'numbers': numbers,
+            }
+
+
+def chunk_to_frame(chunk):
+    frame = pd.DataFrame({
+        'date': format_dates(chunk['date']),
+        'wheel': np.asarray(WHEELS, dtype=object)[chunk['wheel']],
+    })
+    numbers = chunk['numbers']
+    for i, column in enumerate(NUMBER_COLUMNS):
+        frame[column] = pd.arrays.IntegerArray(numbers[:, i], numbers[:, i] == 0)
+    return frame
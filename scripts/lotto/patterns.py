@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from .dataset import NUMBER_COLUMNS
+
+DECADES = [f"{i}-{i+9}" for i in range(1, 91, 10)]
+PATTERN_SPLITS = ["5-0", "4-1", "3-2", "2-3", "1-4", "0-5"]
+
+
+def pattern_features(lotto_data):
+    # One row per draw, aligned with lotto_data's index.
+    numbers = lotto_data[NUMBER_COLUMNS].to_numpy(dtype=float)
+    valid = (numbers >= 1) & (numbers <= 90)
+    numbers = np.where(valid, numbers, 0).astype(np.int16)
+
+    ordered = np.sort(numbers, axis=1)
+    consecutive = (np.diff(ordered, axis=1) == 1) & (ordered[:, :-1] > 0)
+    smallest = np.where(valid, numbers, 91).min(axis=1)
+    decades = ((numbers - 1) // 10)[..., None] == np.arange(len(DECADES))
+
+    features = pd.DataFrame({
+        'date': lotto_data['date'].to_numpy(),
+        'wheel': lotto_data['wheel'].to_numpy(),
+        'drawn': valid.sum(axis=1).astype(np.uint8),
+        'odd': ((numbers % 2 == 1) & valid).sum(axis=1).astype(np.uint8),
+        'low': ((numbers <= 45) & valid).sum(axis=1).astype(np.uint8),
+        'consecutive': consecutive.sum(axis=1).astype(np.uint8),
+        'sum': numbers.sum(axis=1).astype(np.uint16),
+        'spread': np.where(valid.any(axis=1), ordered[:, -1] - smallest, 0).astype(np.uint8),
+    }, index=lotto_data.index)
+    decade_counts = (decades & valid[..., None]).sum(axis=1).astype(np.uint8)
+    for i, decade in enumerate(DECADES):
+        features[decade] = decade_counts[:, i]
+    return features
+
+
+def _split_counts(first):
+    counts = pd.Series(first).value_counts()
+    return {split: int(counts.get(5 - i, 0)) for i, split in enumerate(PATTERN_SPLITS)}
+
+
+def pattern_summary(features):
+    # Only complete five-number draws count towards the split patterns,
+    # matching how the app has always bucketed them.
+    complete = features[features['drawn'] == len(NUMBER_COLUMNS)]
+    total_draws = len(features)
+    consecutive = features['consecutive'].value_counts()
+    return {
+        'total_draws': total_draws,
+        'odd_even_counts': _split_counts(complete['odd']),
+        'high_low_counts': _split_counts(complete['low']),
+        'consecutive_distribution': {i: int(consecutive.get(i, 0)) for i in range(5)},
+        'decade_distributions': {
+            decade: float(features[decade].sum() / total_draws) for decade in DECADES
+        },
+        'odd_numbers': int(features['odd'].sum()),
+        'even_numbers': int(features['drawn'].sum() - features['odd'].sum()),
+        'low_numbers': int(features['low'].sum()),
+        'high_numbers': int(features['drawn'].sum() - features['low'].sum()),
+        'mean_sum': float(features['sum'].mean()),
+        'mean_spread': float(features['spread'].mean()),
+    }
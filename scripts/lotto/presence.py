@@ -0,0 +1,135 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from .dataset import NUMBER_COLUMNS, WHEELS
+
+RECORD_DTYPE = np.dtype([
+    ('date', '<i4'),
+    ('flags', 'u1', (len(WHEELS), 90)),
+])
+
+
+class Presence:
+    # One record per draw date: the date (days since epoch) and, for every
+    # wheel, the 90 drawn/not-drawn flags as one byte each. The flags are
+    # stored unpacked so that `matrix` is a view of the records: loaded
+    # with a memory map, every process reduces over the same pages of the
+    # file instead of a private copy.
+
+    def __init__(self, records):
+        self.records = records
+        self.wheels = WHEELS
+        self.dates = records['date'].astype('datetime64[D]')
+        self._drawn = None
+
+    @classmethod
+    def from_frame(cls, lotto_data):
+        dates = lotto_data['date'].to_numpy(dtype='datetime64[D]')
+        unique_dates, date_index = np.unique(dates, return_inverse=True)
+        wheel_index = pd.Categorical(lotto_data['wheel'], categories=WHEELS).codes
+
+        numbers = lotto_data[NUMBER_COLUMNS].to_numpy(dtype=float)
+        numbers = np.where((numbers >= 1) & (numbers <= 90), numbers, 0).astype(np.intp)
+        known = wheel_index >= 0
+
+        dense = np.zeros((len(unique_dates), len(WHEELS), 91), dtype=bool)
+        dense[date_index[known, None], wheel_index[known, None], numbers[known]] = True
+
+        records = np.zeros(len(unique_dates), dtype=RECORD_DTYPE)
+        records['date'] = unique_dates.astype(np.int64)
+        records['flags'] = dense[..., 1:]
+        return cls(records)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls(np.load(path, mmap_mode='r' if mmap else None))
+
+    def save(self, path):
+        np.save(path, np.asarray(self.records))
+
+    def __len__(self):
+        return len(self.records)
+
+    def prefix_digest(self, dates):
+        # Hash of the first `dates` records, to tell whether an index saved
+        # over them still matches this presence.
+        return hashlib.sha1(np.ascontiguousarray(self.records[:dates])).hexdigest()
+
+    def wheel_index(self, wheel):
+        return self.wheels.index(wheel)
+
+    @property
+    def matrix(self):
+        # draws x wheels x 90, a view of the records (no copy)
+        return self.records['flags'].view(bool)
+
+    @property
+    def drawn(self):
+        # draws x wheels, whether the wheel was drawn on that date
+        if self._drawn is None:
+            self._drawn = self.matrix.any(axis=-1)
+        return self._drawn
+
+    def last_draws_mask(self, last_n):
+        drawn = self.drawn
+        from_end = np.cumsum(drawn[::-1], axis=0)[::-1]
+        return drawn & (from_end <= last_n)
+
+    def recent(self, wheel, last_n):
+        w = self.wheel_index(wheel)
+        mask = self.last_draws_mask(last_n)[:, w]
+        return self.matrix[mask, w].any(axis=0)
+
+
+class PresenceIndex:
+    # Base of the indexes over a presence that are saved up to their last
+    # date and extended with newer draws only. Subclasses count the draws
+    # from a given presence row in _add, and save and restore their own
+    # arrays through _arrays and _from_arrays.
+
+    def __init__(self, presence, last_date=None, digest=None):
+        self.presence = presence
+        self.wheels = presence.wheels
+        self.last_date = last_date
+        # presence.prefix_digest of the indexed dates
+        self.digest = digest
+
+    def extend(self):
+        # Adds the presence draws dated after the last indexed one and
+        # returns how many dates were added.
+        start = 0
+        if self.last_date is not None:
+            start = np.searchsorted(self.presence.dates, self.last_date, side='right')
+        if start >= len(self.presence):
+            return 0
+
+        self._add(start)
+        self.last_date = self.presence.dates[-1]
+        self.digest = self.presence.prefix_digest(len(self.presence))
+        return len(self.presence) - start
+
+    def reusable(self):
+        # Whether a loaded index was built from exactly the first dates of
+        # its presence, up to its last date. A history rebuilt or rewritten
+        # since (even up to the same last date) gives another digest.
+        if self.last_date is None:
+            return True
+        dates = int(np.searchsorted(self.presence.dates, self.last_date, side='right'))
+        return self.digest == self.presence.prefix_digest(dates)
+
+    def save(self, path):
+        np.savez(
+            path,
+            last_date=np.array(self.last_date, dtype='datetime64[D]'),
+            digest=np.array(self.digest or ''),
+            **self._arrays(),
+        )
+
+    @classmethod
+    def load(cls, path, presence):
+        with np.load(path) as stored:
+            last_date = stored['last_date'][()]
+            digest = str(stored['digest']) if 'digest' in stored else None
+            return cls._from_arrays(presence, stored, None if np.isnat(last_date) else last_date, digest)
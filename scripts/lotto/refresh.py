@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from .download import Downloader, _no_progress, save_validators
+from .frequencies import FREQUENCY_WINDOW, frequency_tables, save_frequency_tables
+from .history import PartitionWriter, PartitionedHistory, remove_stale_partitions
+from .metrics import METRICS
+from .parser import chunk_to_frame, read_archive_chunks
+from .store import HISTORY_COLUMNS, StagedFiles, chunk_to_records, history_frame, tail_records
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+ARCHIVE_URL = "https://www.igt.it/STORICO_ESTRAZIONI_LOTTO/storico01-oggi.zip"
+
+
+@contextmanager
+def refresh_lock(data_dir):
+    # Serializes refreshes of one data directory across processes (the app
+    # and a cron job, say). Where flock is unavailable only the in-process
+    # single-flight of RefreshJob applies.
+    with open(os.path.join(data_dir, 'raw', 'refresh.lock'), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def refresh(url=ARCHIVE_URL, data_dir='data', incremental=True, progress=_no_progress, downloader=None):
+    # Downloads the archive and brings the history and stats up to date.
+    # New files are built next to the old ones and swapped in at the end,
+    # the history manifest last (but for the archive's validators), so
+    # readers only ever see a complete dataset. `progress` is called with a
+    # phase name and a fraction done (None if unknown). Pass a Downloader
+    # to reuse its connections.
+    raw_dir = os.path.join(data_dir, 'raw')
+    archive_file = os.path.join(raw_dir, 'lotto_historical.zip')
+    meta_file = os.path.join(raw_dir, 'lotto_historical.json')
+    history_csv = os.path.join(data_dir, 'processed', 'lotto_historical.csv')
+    presence_file = os.path.join(data_dir, 'processed', 'lotto_presence.npy')
+    heat_file = os.path.join(data_dir, 'processed', 'lotto_heat.npz')
+    cooccurrence_file = os.path.join(data_dir, 'historical_stats', 'cooccurrence.npz')
+    stats_dir = os.path.join(data_dir, 'historical_stats')
+
+    with refresh_lock(data_dir):
+        history = PartitionedHistory.open(data_dir)
+        after = history.last_date if incremental else None
+        progress('download', 0.0)
+        with METRICS.timer('lotto_refresh_phase_seconds', phase='download'):
+            # The validators are saved with the history below: if anything
+            # fails before, the next refresh downloads the archive again
+            # instead of hearing it is unchanged and skipping it.
+            validators = (downloader or Downloader()).fetch(url, archive_file, meta_file, progress, save=False)
+        if validators is None and after is not None:
+            return 0
+
+        os.makedirs(history.directory, exist_ok=True)
+        with StagedFiles() as staged:
+            staged_csv = staged.stage(history_csv, copy=after is not None)
+            if after is None:
+                pd.DataFrame(columns=HISTORY_COLUMNS).to_csv(staged_csv, index=False, lineterminator='\r\n')
+            writer = PartitionWriter(history, staged, fresh=after is None)
+
+            new_draws = 0
+            progress('parse', None)
+            with METRICS.timer('lotto_refresh_phase_seconds', phase='parse'):
+                for chunk in read_archive_chunks(archive_file, after=after):
+                    writer.append(chunk_to_records(chunk))
+                    chunk_to_frame(chunk).to_csv(staged_csv, mode='a', header=False, index=False, lineterminator='\r\n')
+                    new_draws += len(chunk['date'])
+                    progress('parse', None)
+
+            if after is not None and not new_draws:
+                save_validators(meta_file, validators)
+                return 0
+            new_history = writer.finish()
+            if validators is not None:
+                # After the manifest, so they are never ahead of the history.
+                save_validators(meta_file, validators, staged)
+
+            # Stats are swapped in first and the history manifest last: it
+            # is the file readers watch for a new version.
+            progress('stats', None)
+            with METRICS.timer('lotto_refresh_phase_seconds', phase='stats'):
+                window_data = history_frame(tail_records(new_history.tail(FREQUENCY_WINDOW), FREQUENCY_WINDOW))
+                with StagedFiles() as stats_staged:
+                    save_frequency_tables(*frequency_tables(window_data), stats_dir=stats_dir, staged=stats_staged)
+                    stats_staged.commit()
+            with METRICS.timer('lotto_refresh_phase_seconds', phase='swap'):
+                staged.commit()
+            if after is None:
+                # Rebuilt from scratch rather than extended with new dates.
+                remove_stale_partitions(history.directory)
+                for derived_file in [presence_file, heat_file, cooccurrence_file]:
+                    if os.path.exists(derived_file):
+                        os.remove(derived_file)
+            METRICS.increment('lotto_refresh_new_draws_total', new_draws)
+
+    progress('done', 1.0)
+    return new_draws
+
+
+class RefreshJob:
+    # A refresh running in a background thread, shared by every session of
+    # the app. start() while a refresh is running joins it instead of
+    # starting another (single flight); status() reports where it is.
+    # Every refresh downloads through the same Downloader and its pooled
+    # session.
+
+    def __init__(self, url=ARCHIVE_URL, data_dir='data', downloader=None):
+        self.url = url
+        self.data_dir = data_dir
+        self.downloader = downloader or Downloader()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = {
+            'state': 'idle', 'phase': None, 'progress': None, 'new_draws': None,
+            'error': None, 'started': None, 'finished': None, 'run': 0,
+        }
+
+    def start(self):
+        # Returns True when this call started a refresh, False when it
+        # joined one already running.
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._status.update(
+                state='running', phase='starting', progress=None, new_draws=None, error=None,
+                started=time.time(), finished=None, run=self._status['run'] + 1,
+            )
+            self._thread = threading.Thread(target=self._run, name='lotto-refresh', daemon=True)
+            self._thread.start()
+            return True
+
+    def _progress(self, phase, done=None):
+        with self._lock:
+            self._status.update(phase=phase, progress=done)
+
+    def _run(self):
+        try:
+            new_draws = refresh(self.url, self.data_dir, progress=self._progress, downloader=self.downloader)
+        except Exception as error:
+            METRICS.increment('lotto_refresh_failures_total')
+            with self._lock:
+                self._status.update(state='failed', error=str(error), finished=time.time())
+        else:
+            with self._lock:
+                self._status.update(state='done', phase='done', progress=1.0, new_draws=new_draws, finished=time.time())
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.status()
@@ -0,0 +1,139 @@
+from functools import reduce
+from operator import add
+
+import numpy as np
+import pandas as pd
+
+CELL_STYLE = 'border: 1px solid #ddd; padding: 8px;'
+
+GRID_COLORS = {
+    'neutral': '#f5f5f5',
+    'recent': '#4caf50',
+    'most_freq': '#1e88e5',
+    'least_freq': '#f44336',
+    'recent_most': '#8bc34a',
+    'recent_least': '#ff9800',
+    'text_dark': '#212121',
+    'text_light': '#ffffff'
+}
+
+# Heat colouring runs from the coldest number through the wheel's average
+# to the hottest.
+HEAT_COLORS = ['#1e88e5', '#f5f5f5', '#f44336']
+
+
+def _cells(values, style):
+    return f"<td style='{style}'>" + values + "</td>"
+
+
+def html_table(frame, header_color=None, width='100%', centered=False, label_column=False, missing_label=None):
+    # The whole table as one HTML string, built column by column with
+    # vectorized string concatenation. Missing values show as '-'; with
+    # `missing_label`, rows missing everything after the first column get
+    # one cell spanning those columns instead. `label_column` bolds the
+    # first column and left-aligns it, as the draws table does.
+    header_style = CELL_STYLE + (f' background-color: {header_color}; color: white;' if header_color else '')
+    cell_style = CELL_STYLE + ' text-align: center;'
+    text = frame.astype(object).where(frame.notna(), '-').astype(str)
+
+    header = ''
+    cells = []
+    for i, column in enumerate(frame.columns):
+        if i == 0 and label_column:
+            header += f"<th style='{header_style} text-align: left;'>{column}</th>"
+            cells.append(_cells(text[column], CELL_STYLE + ' font-weight: bold;'))
+        else:
+            header += f"<th style='{header_style} text-align: center;'>{column}</th>"
+            cells.append(_cells(text[column], cell_style))
+
+    rows = reduce(add, cells) if cells else pd.Series('', index=frame.index)
+    if missing_label is not None and frame.shape[1] > 1:
+        missing = frame.iloc[:, 1:].isna().all(axis=1)
+        merged = cells[0] + f"<td colspan='{frame.shape[1] - 1}' style='{cell_style}'>{missing_label}</td>"
+        rows = rows.where(~missing, merged)
+
+    margin = ' margin: 0 auto;' if centered else ''
+    return (
+        f"<table style='width: {width};{margin} border-collapse: collapse;'><tr>{header}</tr>"
+        + ''.join('<tr>' + rows + '</tr>')
+        + "</table>"
+    )
+
+
+def number_grid(recent, most_frequent, least_frequent, colors=GRID_COLORS):
+    # The 9 x 10 grid of numbers as one CSS grid, coloured by whether each
+    # number was drawn recently and is among the most or least frequent.
+    conditions = [
+        recent & most_frequent,
+        recent & least_frequent,
+        recent,
+        most_frequent,
+        least_frequent,
+    ]
+    background = np.select(conditions, [
+        colors['recent_most'], colors['recent_least'], colors['recent'], colors['most_freq'], colors['least_freq'],
+    ], colors['neutral'])
+    text = np.select(conditions, [
+        colors['text_dark'], colors['text_dark'], colors['text_light'], colors['text_light'], colors['text_light'],
+    ], colors['text_dark'])
+    symbol = np.select(conditions[:2], ['+', '-'], '')
+
+    return _grid(background, text, np.arange(1, 91).astype(str) + symbol)
+
+
+def _rgb(color):
+    return np.array([int(color[i:i + 2], 16) for i in (1, 3, 5)], dtype=float)
+
+
+def heat_levels(scores):
+    # Scores mapped to -1 (coldest) .. 1 (hottest) around their mean.
+    scores = np.asarray(scores, dtype=float)
+    deviation = scores - scores.mean()
+    spread = np.abs(deviation).max()
+    return deviation / spread if spread else np.zeros_like(scores)
+
+
+def heat_colors(scores, stops=HEAT_COLORS):
+    # One hex colour per score, interpolated between the stops.
+    levels = heat_levels(scores)[:, None]
+    cold, middle, hot = (_rgb(color) for color in stops)
+    rgb = np.where(levels < 0, middle - (cold - middle) * levels, middle + (hot - middle) * levels)
+    return np.array(['#%02x%02x%02x' % tuple(channels) for channels in np.rint(rgb).astype(int)])
+
+
+def heat_grid(scores, colors=GRID_COLORS):
+    # The 9 x 10 grid coloured by heat score, the score shown on hover.
+    text = np.where(np.abs(heat_levels(scores)) > 0.5, colors['text_light'], colors['text_dark'])
+    titles = np.char.mod('%.2f', np.asarray(scores, dtype=float))
+    return _grid(heat_colors(scores), text, np.arange(1, 91).astype(str), titles)
+
+
+def _grid(background, text, labels, titles=None):
+    title = '' if titles is None else "title='" + titles + "' "
+    cells = (
+        "<div " + title + "style='background-color:" + background + ";color:" + text
+        + ";padding:10px;text-align:center;border-radius:4px;font-weight:bold;'>"
+        + labels + "</div>"
+    )
+    return (
+        "<div style='display:grid;grid-template-columns:repeat(10, 1fr);gap:1rem;margin-bottom:1rem;'>"
+        + ''.join(cells) + "</div>"
+    )
+
+
+def draw_balls(draws, most_frequent, least_frequent):
+    # One block per draw (newest first as given): the date and its numbers,
+    # blue when among the most frequent and red when among the least.
+    html = ''
+    for date, numbers in zip(draws['date'], draws[['n1', 'n2', 'n3', 'n4', 'n5']].to_numpy(dtype=float)):
+        numbers = numbers[~np.isnan(numbers)].astype(int)
+        background = np.where(most_frequent[numbers - 1], '#1e88e5', np.where(least_frequent[numbers - 1], '#f44336', '#f5f5f5'))
+        text = np.where(background == '#f5f5f5', '#212121', '#ffffff')
+        balls = (
+            "<div style='background-color:" + background + ";color:" + text
+            + ";padding:15px;text-align:center;border-radius:4px;font-weight:bold;width:50px'>"
+            + numbers.astype(str) + "</div>"
+        )
+        html += f"<h5 style='text-align: center;'>{date.strftime('%Y-%m-%d')}</h5>"
+        html += "<div style='display: flex; gap: 10px; margin-bottom: 15px; justify-content: center;'>" + ''.join(balls) + "</div>"
+    return html
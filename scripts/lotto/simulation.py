@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from math import comb
+
+import numpy as np
+import pandas as pd
+
+SIMULATIONS = 1000
+WINDOW = 100
+TOP_RANK = 10
+HISTORIES_PER_BATCH = 8
+
+# Probability of k odd numbers in a draw of 5 from 45 odd and 45 even.
+ODD_PROBABILITIES = np.array([comb(45, k) * comb(45, 5 - k) for k in range(6)]) / comb(90, 5)
+
+STATISTICS = ['frequency_chi2', 'odd_even_chi2', 'max_delay', 'window_max', 'window_top', 'window_min']
+
+# Which tail counts as "more extreme" for each statistic's p-value.
+UPPER_TAIL = {
+    'frequency_chi2': True,
+    'odd_even_chi2': True,
+    'max_delay': True,
+    'window_max': True,
+    'window_top': True,
+    'window_min': False,
+}
+
+
+def random_numbers(rng, shape):
+    # Uniform 5-of-90 draws as 0-based numbers, ascending along the last
+    # axis. The j-th pick is uniform over the 90 - j numbers left, mapped
+    # past the numbers already picked, so only five integers are drawn per
+    # row instead of a key for each of the 90 numbers.
+    picks = np.empty(shape + (5,), dtype=np.int64)
+    for j in range(5):
+        pick = rng.integers(0, 90 - j, size=shape)
+        for i in range(j):
+            pick += pick >= picks[..., i]
+        picks[..., j] = pick
+        picks[..., :j + 1].sort(axis=-1)
+    return picks
+
+
+def random_draws(rng, shape):
+    draws = np.zeros(shape + (90,), dtype=bool)
+    np.put_along_axis(draws, random_numbers(rng, shape), True, axis=-1)
+    return draws
+
+
+def history_statistics(draws, window=WINDOW, top_rank=TOP_RANK):
+    # The statistics the app shows, for one or more histories of shape
+    # (..., draws, 90). Window statistics come from the last `window` draws.
+    length = draws.shape[-2]
+    counts = draws.sum(axis=-2)
+    expected = length * 5 / 90
+    frequency_chi2 = ((counts - expected) ** 2 / expected).sum(axis=-1)
+
+    odd_counts = draws[..., 0::2].sum(axis=-1)
+    odd_histogram = (odd_counts[..., None] == np.arange(6)).sum(axis=-2)
+    odd_expected = length * ODD_PROBABILITIES
+    odd_even_chi2 = ((odd_histogram - odd_expected) ** 2 / odd_expected).sum(axis=-1)
+
+    reverse = draws[..., ::-1, :]
+    delays = np.where(reverse.any(axis=-2), reverse.argmax(axis=-2), length)
+    max_delay = delays.max(axis=-1)
+
+    window_counts = np.sort(draws[..., -window:, :].sum(axis=-2), axis=-1)
+    return {
+        'frequency_chi2': frequency_chi2,
+        'odd_even_chi2': odd_even_chi2,
+        'max_delay': max_delay,
+        'window_max': window_counts[..., -1],
+        'window_top': window_counts[..., -top_rank],
+        'window_min': window_counts[..., 0],
+    }
+
+
+def _simulate(seed, histories, length, window):
+    rng = np.random.default_rng(seed)
+    results = {name: [] for name in STATISTICS}
+    for start in range(0, histories, HISTORIES_PER_BATCH):
+        batch = min(HISTORIES_PER_BATCH, histories - start)
+        statistics = history_statistics(random_draws(rng, (batch, length)), window)
+        for name in STATISTICS:
+            results[name].append(statistics[name])
+    return {name: np.concatenate(values) for name, values in results.items()}
+
+
+def null_distribution(length, simulations=SIMULATIONS, window=WINDOW, seed=0, workers=None):
+    # Simulates `simulations` random histories of `length` draws and returns
+    # each statistic's value per history. Histories are split over a process
+    # pool, each part with its own child seed, so results only depend on
+    # `seed` and the number of parts. Workers are spawned rather than
+    # forked, which is unsafe from a multithreaded process such as a web
+    # server.
+    workers = workers or os.cpu_count() or 1
+    parts = max(1, min(workers, simulations))
+    sizes = [len(part) for part in np.array_split(np.arange(simulations), parts)]
+    seeds = np.random.SeedSequence(seed).spawn(parts)
+
+    if parts == 1:
+        results = [_simulate(seeds[0], simulations, length, window)]
+    else:
+        with ProcessPoolExecutor(max_workers=parts, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [
+                executor.submit(_simulate, part_seed, size, length, window)
+                for part_seed, size in zip(seeds, sizes)
+            ]
+            results = [future.result() for future in futures]
+    return {name: np.concatenate([result[name] for result in results]) for name in STATISTICS}
+
+
+def p_value(null, observed, upper=True):
+    # Share of simulated histories at least as extreme as the observed one,
+    # counting the observation itself so it is never zero.
+    extreme = (null >= observed) if upper else (null <= observed)
+    return (extreme.sum() + 1) / (len(null) + 1)
+
+
+def randomness_report(presence, simulations=SIMULATIONS, window=WINDOW, seed=0, workers=None):
+    # One row per wheel and statistic: observed value, the central 95% of
+    # the simulated values and the p-value. Wheels with the same number of
+    # draws share one simulation.
+    rows = []
+    nulls = {}
+    drawn = presence.drawn
+    for w, wheel in enumerate(presence.wheels):
+        draws = presence.matrix[drawn[:, w], w]
+        if len(draws) < window:
+            continue
+        if len(draws) not in nulls:
+            nulls[len(draws)] = null_distribution(len(draws), simulations, window, seed, workers)
+        null = nulls[len(draws)]
+        observed = history_statistics(draws, window)
+        for name in STATISTICS:
+            low, high = np.percentile(null[name], [2.5, 97.5])
+            rows.append({
+                'wheel': wheel,
+                'statistic': name,
+                'draws': len(draws),
+                'observed': float(observed[name]),
+                'null_mean': null[name].mean(),
+                'null_low': low,
+                'null_high': high,
+                'p_value': p_value(null[name], observed[name], UPPER_TAIL[name]),
+            })
+    return pd.DataFrame(rows)
@@ -0,0 +1,169 @@
+import os
+import threading
+
+from .cube import CountCube
+from .dataset import WHEELS
+from .dateindex import DateIndex
+from .history import MANIFEST_FILE, RECENT_DRAWS, PartitionedHistory, history_dir
+from .metrics import METRICS
+from .patterns import pattern_features
+from .store import history_frame
+from .transitions import TransitionIndex
+from .wheels import WheelViews
+from .workspace import DATA_DIR, load_cooccurrence, load_delay_statistics, load_heat, load_presence, load_stats_tables
+
+
+def history_signature(data_dir=DATA_DIR):
+    # Cheap check for a history rewritten by another process: a refresh
+    # always swaps the manifest in last.
+    try:
+        stat = os.stat(os.path.join(history_dir(data_dir), MANIFEST_FILE))
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Dataset:
+    # One version of the history, its saved statistics and everything
+    # derived from it, identified by a hash of its content. A Dataset is
+    # shared by every session and never modified after it is loaded: a
+    # refresh builds a new one. Only the partitions holding the latest
+    # RECENT_DRAWS draws of each wheel are read up front (`recent`); the
+    # whole history (`lotto_data`) and everything else is built on first use.
+
+    def __init__(self, history, most_frequent, least_frequent, frequencies, data_dir=DATA_DIR):
+        self.history = history
+        self.most_frequent = most_frequent
+        self.least_frequent = least_frequent
+        self.frequencies = frequencies
+        self.data_dir = data_dir
+        self.version = history.version
+        self.recent = history_frame(history.tail(RECENT_DRAWS))
+        self._derived = {}
+        # Reentrant: building one value may need another (the count cube
+        # reads the presence).
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, data_dir=DATA_DIR):
+        with METRICS.timer('lotto_stage_seconds', stage='load'):
+            dataset = cls(PartitionedHistory.open(data_dir), *load_stats_tables(data_dir), data_dir=data_dir)
+        METRICS.set('lotto_dataset_draws', len(dataset.history))
+        METRICS.set('lotto_dataset_recent_bytes', int(dataset.recent.memory_usage(deep=True).sum()))
+        return dataset
+
+    @property
+    def empty(self):
+        return len(self.history) == 0
+
+    def _derive(self, name, build):
+        value = self._derived.get(name)
+        if value is None:
+            with self._lock:
+                value = self._derived.get(name)
+                if value is None:
+                    with METRICS.timer('lotto_stage_seconds', stage=name):
+                        value = self._derived[name] = build()
+        return value
+
+    @property
+    def lotto_data(self):
+        return self._derive('lotto_data', lambda: history_frame(self.history.records()))
+
+    def draws(self, start, end):
+        # Every wheel's draws dated from `start` to `end`, both included,
+        # found through the date indexes of the partitions of those years.
+        return history_frame(self.history.between(start, end))
+
+    @property
+    def presence(self):
+        return self._derive('presence', lambda: load_presence(self.history, self.data_dir))
+
+    @property
+    def date_index(self):
+        # The distinct draw dates, from the presence, which is known without
+        # reading older partitions: for navigation and counting the dates in
+        # a span. Rows are looked up in each partition's own index.
+        return self._derive('date_index', lambda: DateIndex(self.presence.dates))
+
+    @property
+    def count_cube(self):
+        return self._derive('count_cube', lambda: CountCube(self.presence))
+
+    @property
+    def features(self):
+        return self._derive('features', lambda: pattern_features(self.lotto_data))
+
+    @property
+    def recent_features(self):
+        return self._derive('recent_features', lambda: pattern_features(self.recent))
+
+    @property
+    def wheels(self):
+        # Wheels with at least one draw, in WHEELS order: the choices of
+        # every wheel selector.
+        return self._derive(
+            'wheels', lambda: [wheel for wheel, draws in zip(WHEELS, self.history.draw_counts) if draws]
+        )
+
+    def by_wheel(self, name):
+        # WheelViews of one of the frames above (recent, most_frequent,
+        # delay_statistics...), grouped once per Dataset.
+        return self._derive(f'{name}_by_wheel', lambda: WheelViews(getattr(self, name)))
+
+    def pattern_window(self, wheel, count):
+        # Windows within the recent draws are answered without loading the
+        # whole history.
+        name = 'recent_features' if count <= RECENT_DRAWS else 'features'
+        return self.by_wheel(name).tail(wheel, count)
+
+    @property
+    def cooccurrence(self):
+        return self._derive('cooccurrence', lambda: load_cooccurrence(self.presence, self.data_dir))
+
+    @property
+    def heat(self):
+        return self._derive('heat', lambda: load_heat(self.presence, self.data_dir))
+
+    @property
+    def transitions(self):
+        # Its lag and window matrices are built on first query and kept
+        # with this version.
+        return self._derive('transitions', lambda: TransitionIndex(self.presence))
+
+    @property
+    def delay_statistics(self):
+        return self._derive(
+            'delay_statistics', lambda: load_delay_statistics(self.presence, self.version, self.data_dir)
+        )
+
+
+class DatasetRegistry:
+    # Holds the current Dataset. current() swaps in a new one when the
+    # history file changed on disk (a refresh here or in another process);
+    # callers keep the Dataset they got, so work already running finishes
+    # on the previous version while new work sees the new one.
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self._current = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        signature = history_signature(self.data_dir)
+        if self._current is None or signature != self._signature:
+            with self._lock:
+                if self._current is None or signature != self._signature:
+                    dataset = Dataset.load(self.data_dir)
+                    METRICS.increment('lotto_dataset_loads_total')
+                    if self._current is None or dataset.version != self._current.version:
+                        self._current = dataset
+                        METRICS.increment('lotto_dataset_versions_total')
+                    self._signature = signature
+        return self._current
+
+    def publish(self, dataset):
+        with self._lock:
+            self._current = dataset
+            self._signature = history_signature(self.data_dir)
@@ -0,0 +1,166 @@
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .dataset import NUMBER_COLUMNS, WHEELS
+
+# Fixed-size little-endian records, stored headerless so that new draws can
+# be appended to the file and the whole history memory-mapped.
+HISTORY_DTYPE = np.dtype([
+    ('date', '<i4'),
+    ('wheel', 'u1'),
+    ('numbers', 'u1', (len(NUMBER_COLUMNS),)),
+])
+
+STATS_DTYPE = np.dtype([
+    ('wheel', 'u1'),
+    ('number', 'u1'),
+    ('frequency', '<u2'),
+])
+
+HISTORY_COLUMNS = ['date', 'wheel'] + NUMBER_COLUMNS
+STATS_COLUMNS = ['wheel', 'number', 'frequency']
+
+
+def chunk_to_records(chunk):
+    records = np.empty(len(chunk['date']), dtype=HISTORY_DTYPE)
+    records['date'] = chunk['date']
+    records['wheel'] = chunk['wheel']
+    records['numbers'] = chunk['numbers']
+    return records
+
+
+def frame_to_records(lotto_data):
+    records = np.empty(len(lotto_data), dtype=HISTORY_DTYPE)
+    records['date'] = pd.to_datetime(lotto_data['date']).to_numpy(dtype='datetime64[D]').astype(np.int32)
+    records['wheel'] = pd.Categorical(lotto_data['wheel'], categories=WHEELS).codes
+    numbers = lotto_data[NUMBER_COLUMNS].to_numpy(dtype=float)
+    records['numbers'] = np.where((numbers >= 1) & (numbers <= 90), numbers, 0)
+    return records
+
+
+def read_history(path, mmap=True):
+    if not os.path.exists(path) or os.path.getsize(path) < HISTORY_DTYPE.itemsize:
+        return np.empty(0, dtype=HISTORY_DTYPE)
+    if mmap:
+        return np.memmap(path, dtype=HISTORY_DTYPE, mode='r')
+    return np.fromfile(path, dtype=HISTORY_DTYPE)
+
+
+def append_history(path, records):
+    with open(path, 'ab') as f:
+        f.write(np.ascontiguousarray(records, dtype=HISTORY_DTYPE).tobytes())
+
+
+def tail_records(records, window):
+    # Smallest tail of the history holding the last `window` draws of every
+    # wheel (or the whole history if it is shorter).
+    count = window * len(WHEELS)
+    while count < len(records):
+        tail = records[-count:]
+        draws = np.bincount(tail['wheel'], minlength=len(WHEELS))[:len(WHEELS)]
+        if (draws >= window).all():
+            return tail
+        count *= 2
+    return records
+
+
+def _number_column(values):
+    missing = values == 0
+    if missing.any():
+        return pd.arrays.IntegerArray(values, missing)
+    return values
+
+
+def history_frame(records):
+    records = np.asarray(records)
+    lotto_data = pd.DataFrame({
+        'date': records['date'].astype('datetime64[D]').astype('datetime64[s]'),
+        'wheel': pd.Categorical.from_codes(records['wheel'].astype(np.int8), WHEELS),
+    })
+    numbers = records['numbers']
+    for i, column in enumerate(NUMBER_COLUMNS):
+        lotto_data[column] = _number_column(np.ascontiguousarray(numbers[:, i]))
+    return lotto_data
+
+
+def temporary_path(path):
+    # A sibling of `path` unique to this process and thread, keeping the
+    # extension so that np.save/np.savez do not append another one.
+    root, extension = os.path.splitext(path)
+    return f"{root}.{os.getpid()}-{threading.get_ident()}.tmp{extension}"
+
+
+def replace_file(path, write):
+    # Writes through a temporary file next to `path` and swaps it in with
+    # os.replace, so readers (and memory maps) see the old or the new file,
+    # never a partial one.
+    with StagedFiles() as staged:
+        with open(staged.stage(path), 'wb') as f:
+            write(f)
+        staged.commit()
+
+
+class StagedFiles:
+    # Temporary versions of several files, written in full and then swapped
+    # in with os.replace in the order they were staged (so the file readers
+    # watch for changes can go last), or removed if commit() never runs.
+
+    def __init__(self):
+        self._files = []
+
+    def stage(self, path, copy=False):
+        temporary = temporary_path(path)
+        if copy and os.path.exists(path):
+            shutil.copyfile(path, temporary)
+        self._files.append((path, temporary))
+        return temporary
+
+    def commit(self):
+        for path, temporary in self._files:
+            os.replace(temporary, path)
+        self._files = []
+
+    def discard(self):
+        for _, temporary in self._files:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        self._files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.discard()
+
+
+def save_stats(path, table):
+    records = np.empty(len(table), dtype=STATS_DTYPE)
+    records['wheel'] = pd.Categorical(table['wheel'], categories=WHEELS).codes
+    records['number'] = table['number']
+    records['frequency'] = table['frequency']
+    np.save(path, records)
+
+
+def load_stats(path):
+    records = np.load(path)
+    return pd.DataFrame({
+        'wheel': pd.Categorical.from_codes(records['wheel'].astype(np.int8), WHEELS),
+        'number': records['number'],
+        'frequency': records['frequency'],
+    })
+
+
+def migrate_csv(data_dir='data'):
+    # Builds the binary statistics from the CSV exports when they do not
+    # exist yet. The history is migrated by history.migrate_history.
+    stats_dir = os.path.join(data_dir, 'historical_stats')
+    for name in ['most_frequent', 'least_frequent', 'numbers_frequency']:
+        stats_file = os.path.join(stats_dir, f'{name}.npy')
+        stats_csv = os.path.join(stats_dir, f'{name}.csv')
+        if not os.path.exists(stats_file) and os.path.exists(stats_csv):
+            table = pd.read_csv(stats_csv)
+            replace_file(stats_file, lambda f: save_stats(f, table))
@@ -0,0 +1,109 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+MAX_LAG = 12
+# Dates per block of the products: bounds the float32 copies to about
+# BLOCK_DATES x 990 x 4 bytes whatever the history length.
+BLOCK_DATES = 16384
+
+
+class TransitionIndex:
+    # What follows a number: for a source wheel x number drawn on date t,
+    # how often each target wheel x number is drawn `lag` dates later, or
+    # at least once within the next k dates (numeri spia). All wheels are
+    # stacked into one dates x (11 * 90) matrix X, so every wheel pair at
+    # one lag is the single product X[:-lag].T @ X[lag:], computed in
+    # blocks of dates through float32 BLAS (exact below 2**24 per block)
+    # and kept per lag or k for the life of the index, i.e. of a Dataset
+    # version.
+
+    def __init__(self, presence):
+        self.presence = presence
+        self.wheels = presence.wheels
+        self._lags = {}
+        self._within = {}
+        self._lock = threading.Lock()
+
+    def _flat(self, lo, hi):
+        return self.presence.matrix[lo:hi].reshape(hi - lo, -1).astype(np.float32)
+
+    def _product(self, dates, sources, targets):
+        # Sum over blocks of sources(lo, hi).T @ targets(lo, hi) for source
+        # rows 0..dates-1.
+        size = len(self.wheels) * 90
+        total = np.zeros((size, size), dtype=np.int32)
+        for lo in range(0, dates, BLOCK_DATES):
+            hi = min(lo + BLOCK_DATES, dates)
+            total += (sources(lo, hi).T @ targets(lo, hi)).astype(np.int32)
+        return total
+
+    def _cached(self, cache, key, build):
+        value = cache.get(key)
+        if value is None:
+            with self._lock:
+                value = cache.get(key)
+                if value is None:
+                    value = cache[key] = build()
+        return value
+
+    def lag(self, lag):
+        # (11 * 90) x (11 * 90) counts of source drawn on date t and target
+        # drawn on date t + lag.
+        dates = max(len(self.presence) - lag, 0)
+        return self._cached(self._lags, lag, lambda: self._product(
+            dates, self._flat, lambda lo, hi: self._flat(lo + lag, hi + lag)
+        ))
+
+    def _window(self, k, lo, hi, wheel=slice(None)):
+        # 1 where the target is drawn at least once on dates t+1 .. t+k,
+        # for source dates lo .. hi-1.
+        matrix = self.presence.matrix[:, wheel]
+        counts = np.zeros((hi - lo,) + matrix.shape[1:], dtype=np.int16)
+        for lag in range(1, k + 1):
+            counts += matrix[lo + lag:hi + lag]
+        return (counts > 0).reshape(hi - lo, -1).astype(np.float32)
+
+    def within(self, k):
+        # (11 * 90) x (11 * 90) counts of source drawn on date t and target
+        # drawn at least once on dates t+1 .. t+k.
+        dates = max(len(self.presence) - k, 0)
+        return self._cached(self._within, k, lambda: self._product(
+            dates, self._flat, lambda lo, hi: self._window(k, lo, hi)
+        ))
+
+    def followers(self, wheel, number, k=3, target_wheel=None, top=10, exact=False):
+        # The numbers most often drawn on `target_wheel` (default: the same
+        # wheel) within k draws after `number` came out on `wheel`, or
+        # exactly k draws after with exact=True. Only draws with k later
+        # dates count. `rate` is the share of those draws followed by the
+        # number, `base_rate` the same share over all of the wheel's draws
+        # and `lift` their ratio. The table's attrs hold `occurrences`.
+        source = self.wheels.index(wheel)
+        target = self.wheels.index(target_wheel or wheel)
+        row = source * 90 + number - 1
+        columns = slice(target * 90, target * 90 + 90)
+        dates = max(len(self.presence) - k, 0)
+        occurrences = int(self.presence.matrix[:dates, source, number - 1].sum())
+        source_dates = self.presence.drawn[:dates, source]
+
+        if exact:
+            counts = self.lag(k)[row, columns]
+            base = self.presence.matrix[k:k + dates, target][source_dates].sum(axis=0)
+        else:
+            counts = self.within(k)[row, columns]
+            base = self._window(k, 0, dates, target)[source_dates].sum(axis=0)
+
+        rate = counts / occurrences if occurrences else np.zeros(90)
+        base_rate = base / source_dates.sum() if source_dates.any() else np.zeros(90)
+        table = pd.DataFrame({
+            'number': np.arange(1, 91),
+            'count': counts.astype(np.int64),
+            'rate': rate,
+            'base_rate': base_rate,
+            'lift': np.divide(rate, base_rate, out=np.zeros(90), where=base_rate > 0),
+        })
+        table = table.sort_values(['count', 'lift'], ascending=False, kind='stable').head(top).reset_index(drop=True)
+        table.attrs['occurrences'] = occurrences
+        return table
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from .dataset import WHEELS
+
+
+class WheelViews:
+    # The rows of a frame with a 'wheel' column grouped by wheel, built
+    # once: rows are sorted by wheel, then by date when there is a date
+    # column (otherwise kept in their order, as in the ranked statistics),
+    # and every wheel is an offset range of the grouped frame, so selecting
+    # one is a slice instead of a filter over the whole frame. Wheel None is
+    # all wheels together, the frame as given.
+
+    def __init__(self, frame):
+        self.frame = frame
+        codes = pd.Categorical(frame['wheel'], categories=WHEELS).codes
+        if 'date' in frame:
+            order = np.lexsort((frame['date'].to_numpy(), codes))
+        else:
+            order = np.argsort(codes, kind='stable')
+        self.grouped = frame.iloc[order]
+        # Rows of an unknown wheel (code -1) sort first and belong to none.
+        self.offsets = np.searchsorted(codes[order], np.arange(len(WHEELS) + 1))
+        self._index = {wheel: i for i, wheel in enumerate(WHEELS)}
+
+    def __getitem__(self, wheel):
+        if wheel is None:
+            return self.frame
+        i = self._index[wheel]
+        return self.grouped.iloc[self.offsets[i]:self.offsets[i + 1]]
+
+    def __len__(self):
+        return len(self.frame)
+
+    def count(self, wheel):
+        if wheel is None:
+            return len(self.frame)
+        i = self._index[wheel]
+        return int(self.offsets[i + 1] - self.offsets[i])
+
+    @property
+    def wheels(self):
+        # Wheels with at least one row, in WHEELS order.
+        return [wheel for i, wheel in enumerate(WHEELS) if self.offsets[i + 1] > self.offsets[i]]
+
+    def tail(self, wheel, count):
+        # The last `count` rows of one wheel, or for all wheels every row of
+        # the last `count` dates, selected in one pass over the date column.
+        if wheel is not None:
+            rows = self[wheel]
+            return rows.iloc[max(len(rows) - count, 0):]
+        dates = self.frame['date'].to_numpy()
+        distinct = np.unique(dates)
+        if not len(distinct):
+            return self.frame
+        return self.frame[dates >= distinct[-min(count, len(distinct))]]
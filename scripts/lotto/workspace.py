@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .cooccurrence import CooccurrenceIndex
+from .delays import DelayHistory
+from .heat import HALF_LIVES, HeatIndex
+from .history import HISTORY_DIR
+from .presence import RECORD_DTYPE, Presence
+from .store import history_frame, load_stats, migrate_csv, replace_file
+
+DATA_DIR = 'data'
+STATS_TABLES = ['most_frequent', 'least_frequent', 'numbers_frequency']
+
+
+def data_path(data_dir, *parts):
+    return os.path.join(data_dir, *parts)
+
+
+def presence_file(data_dir=DATA_DIR):
+    return data_path(data_dir, 'processed', 'lotto_presence.npy')
+
+
+def ensure_dirs(data_dir=DATA_DIR):
+    for name in ['raw', 'processed', 'historical_stats', HISTORY_DIR]:
+        os.makedirs(data_path(data_dir, name), exist_ok=True)
+
+
+def load_stats_tables(data_dir=DATA_DIR):
+    # The saved most/least/all frequency tables, with empty tables for the
+    # ones that have not been computed yet.
+    migrate_csv(data_dir)
+    tables = []
+    for name in STATS_TABLES:
+        try:
+            tables.append(load_stats(data_path(data_dir, 'historical_stats', f'{name}.npy')))
+        except FileNotFoundError:
+            tables.append(pd.DataFrame(columns=['wheel', 'number', 'frequency']))
+    return tables
+
+
+def load_presence(history, data_dir=DATA_DIR):
+    # Memory-maps the presence array. When the history has newer dates it is
+    # extended with just those, read from the latest partitions; it is only
+    # rebuilt from the whole history when missing. A history behind the
+    # file (an older version still in use) gets the file's first dates and
+    # never writes it, so that versions in use do not undo each other.
+    path = presence_file(data_dir)
+    presence = Presence.load(path) if os.path.exists(path) else None
+    if presence is not None and presence.records.dtype != RECORD_DTYPE:
+        # Written in an older layout: rebuilt below.
+        presence = None
+    last = int(presence.records['date'][-1]) if presence is not None and len(presence) else None
+    if last is not None and last == history.last_date:
+        return presence
+    if last is not None and (history.last_date is None or last > history.last_date):
+        dates = 0 if history.last_date is None else np.searchsorted(presence.records['date'], history.last_date, 'right')
+        return Presence(presence.records[:dates])
+
+    if last is not None:
+        newer = Presence.from_frame(history_frame(history.between(last + 1, history.last_date)))
+        records = np.concatenate([presence.records, newer.records])
+    else:
+        records = Presence.from_frame(history_frame(history.records())).records
+    replace_file(path, Presence(records).save)
+    return Presence.load(path)
+
+
+def load_index(index_class, index_file, presence, **options):
+    # Loads a saved PresenceIndex and extends it with any newer draws; it is
+    # rebuilt when saved over other draws than this presence or with other
+    # options.
+    index = None
+    if os.path.exists(index_file):
+        index = index_class.load(index_file, presence)
+        if not index.reusable(**options):
+            index = None
+    if index is None:
+        index = index_class(presence, **options)
+
+    if index.extend():
+        replace_file(index_file, index.save)
+    return index
+
+
+def load_cooccurrence(presence, data_dir=DATA_DIR):
+    return load_index(CooccurrenceIndex, data_path(data_dir, 'historical_stats', 'cooccurrence.npz'), presence)
+
+
+def load_heat(presence, data_dir=DATA_DIR, half_lives=HALF_LIVES):
+    return load_index(HeatIndex, data_path(data_dir, 'processed', 'lotto_heat.npz'), presence, half_lives=half_lives)
+
+
+def load_delay_statistics(presence, version, data_dir=DATA_DIR):
+    gaps_file = data_path(data_dir, 'processed', 'lotto_delay_gaps.npz')
+    history = DelayHistory.load(gaps_file, version) if os.path.exists(gaps_file) else None
+    if history is not None:
+        return history.statistics()
+
+    history = DelayHistory.from_presence(presence)
+    replace_file(gaps_file, lambda f: history.save(f, version))
+    statistics = history.statistics()
+    replace_file(
+        data_path(data_dir, 'historical_stats', 'delay_statistics.csv'), lambda f: statistics.to_csv(f, index=False)
+    )
+    return statistics
@@ -0,0 +1,72 @@
+import os
+import sys
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from lotto.bench import synthetic_archive  # noqa: E402
+from lotto.dataset import NUMBER_COLUMNS, WHEELS  # noqa: E402
+from lotto.download import serve_archive  # noqa: E402
+from lotto.parser import ARCHIVE_MEMBER  # noqa: E402
+from lotto.presence import Presence  # noqa: E402
+from lotto.simulation import random_numbers  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def archive_lines(tmp_path_factory):
+    # The lines of a synthetic archive, 11 per date in date order.
+    path = tmp_path_factory.mktemp('archive') / 'synthetic.zip'
+    synthetic_archive(str(path))
+    with zipfile.ZipFile(path) as zip_ref:
+        return zip_ref.read(ARCHIVE_MEMBER).splitlines(keepends=True)
+
+
+@pytest.fixture
+def make_archive(tmp_path, archive_lines):
+    # make_archive(name, dates) writes a zip of the first `dates` dates.
+    def make(name, dates=None):
+        path = tmp_path / name
+        lines = archive_lines if dates is None else archive_lines[:dates * len(WHEELS)]
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+            zip_ref.writestr(ARCHIVE_MEMBER, b''.join(lines))
+        return str(path)
+    return make
+
+
+@pytest.fixture
+def serve():
+    # serve(path, **options) starts a local archive server and returns it
+    # with the archive's URL; servers are shut down after the test.
+    servers = []
+
+    def start(path, **options):
+        server = serve_archive(path, **options)
+        servers.append(server)
+        return server, f'http://127.0.0.1:{server.server_port}/lotto_historical.zip'
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def presence():
+    # 120 dates of random draws; NAZIONALE only draws from the 40th date and
+    # BARI skips every seventh one, so wheels have different draw counts.
+    rng = np.random.default_rng(7)
+    dates = np.datetime64('2020-01-01') + np.arange(120)
+    rows = []
+    for i, date in enumerate(dates):
+        for wheel in WHEELS:
+            if (wheel == 'NAZIONALE' and i < 40) or (wheel == 'BARI' and i % 7 == 3):
+                continue
+            rows.append((date, wheel))
+    frame = pd.DataFrame(rows, columns=['date', 'wheel'])
+    numbers = rng.permuted(random_numbers(rng, (len(frame),)) + 1, axis=-1)
+    for i, column in enumerate(NUMBER_COLUMNS):
+        frame[column] = numbers[:, i]
+    return Presence.from_frame(frame)
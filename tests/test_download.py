@@ -0,0 +1,97 @@
+import filecmp
+import os
+
+import pytest
+
+from lotto.download import Downloader, DownloadError
+
+
+def no_sleep(seconds):
+    pass
+
+
+@pytest.fixture
+def target(tmp_path):
+    return str(tmp_path / 'raw.zip'), str(tmp_path / 'raw.json')
+
+
+def test_conditional_download(make_archive, serve, target):
+    source = make_archive('source.zip')
+    server, url = serve(source)
+    archive_file, meta_file = target
+
+    validators = Downloader(sleep=no_sleep).fetch(url, archive_file, meta_file)
+    assert validators['etag']
+    assert filecmp.cmp(archive_file, source, shallow=False)
+    assert os.path.exists(meta_file)
+
+    assert Downloader(sleep=no_sleep).fetch(url, archive_file, meta_file) is None
+    assert server.requests[-1]['If-None-Match'] == validators['etag']
+    assert not os.path.exists(archive_file + '.part')
+
+
+def test_resumes_dropped_transfers(make_archive, serve, target):
+    source = make_archive('source.zip')
+    server, url = serve(source, drop_after=100_000)
+    archive_file, meta_file = target
+
+    assert Downloader(sleep=no_sleep, chunk_size=8192).fetch(url, archive_file, meta_file)
+    assert filecmp.cmp(archive_file, source, shallow=False)
+    # Each request resumes after the bytes already on disk.
+    ranges = [request.get('Range') for request in server.requests]
+    offsets = [int(value[len('bytes='):-1]) for value in ranges[1:]]
+    assert ranges[0] is None and len(ranges) > 2
+    assert all(0 < b - a <= 100_000 for a, b in zip([0] + offsets, offsets))
+
+
+def test_next_run_resumes_a_partial_file(make_archive, serve, target):
+    source = make_archive('source.zip')
+    server, url = serve(source, drop_after=100_000)
+    archive_file, meta_file = target
+
+    with pytest.raises(DownloadError):
+        Downloader(attempts=1, sleep=no_sleep, chunk_size=8192).fetch(url, archive_file, meta_file)
+    partial = os.path.getsize(archive_file + '.part')
+    assert 0 < partial <= 100_000
+    assert not os.path.exists(archive_file)
+
+    assert Downloader(sleep=no_sleep, chunk_size=8192).fetch(url, archive_file, meta_file)
+    assert server.requests[1]['Range'] == f'bytes={partial}-'
+    assert filecmp.cmp(archive_file, source, shallow=False)
+
+
+def test_retries_busy_server(make_archive, serve, target):
+    source = make_archive('source.zip')
+    server, url = serve(source, fail_first=2)
+    delays = []
+
+    assert Downloader(sleep=delays.append, backoff=1.0).fetch(url, *target)
+    assert len(server.requests) == 3
+    # Exponential backoff with jitter: 1 s, then 2 s, each halved at most.
+    assert 0.5 <= delays[0] <= 1.0 and 1.0 <= delays[1] <= 2.0
+
+
+def test_gives_up_without_progress(make_archive, serve, target):
+    source = make_archive('source.zip')
+    server, url = serve(source, fail_first=10)
+    archive_file, meta_file = target
+
+    with pytest.raises(DownloadError, match='3 attempts'):
+        Downloader(attempts=3, sleep=no_sleep).fetch(url, archive_file, meta_file)
+    assert len(server.requests) == 3
+    assert not os.path.exists(archive_file)
+    assert not os.path.exists(meta_file)
+
+
+def test_never_swaps_in_a_corrupt_archive(tmp_path, make_archive, serve, target):
+    source = make_archive('source.zip')
+    corrupt = tmp_path / 'corrupt.zip'
+    body = open(source, 'rb').read()
+    corrupt.write_bytes(body[:len(body) // 2] + b'x' * (len(body) - len(body) // 2))
+    archive_file, meta_file = target
+    Downloader(sleep=no_sleep).fetch(serve(source)[1], archive_file, meta_file)
+
+    with pytest.raises(DownloadError, match='not a valid zip'):
+        Downloader(attempts=2, sleep=no_sleep).fetch(serve(str(corrupt))[1], archive_file, meta_file)
+    assert filecmp.cmp(archive_file, source, shallow=False)
+    assert not os.path.exists(archive_file + '.part')
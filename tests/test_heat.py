@@ -0,0 +1,53 @@
+import numpy as np
+
+from lotto.heat import HALF_LIVES, HeatIndex
+from lotto.presence import Presence
+from lotto.workspace import ensure_dirs, load_heat
+
+
+def direct_scores(presence, half_lives):
+    # One draw at a time: the wheel's scores decay once and the drawn
+    # numbers gain 1.
+    scores = np.zeros((len(half_lives), len(presence.wheels), 90))
+    for h, half_life in enumerate(half_lives):
+        decay = 0.5 ** (1 / half_life)
+        for t in range(len(presence)):
+            for w in range(len(presence.wheels)):
+                if presence.drawn[t, w]:
+                    scores[h, w] = scores[h, w] * decay + presence.matrix[t, w]
+    return scores
+
+
+def test_scores_match_a_direct_loop(presence):
+    index = HeatIndex(presence)
+    assert index.extend() == len(presence)
+    assert np.allclose(index.scores, direct_scores(presence, HALF_LIVES))
+    assert np.array_equal(index.scores_for('ROMA', 25), index.scores[HALF_LIVES.index(25), presence.wheels.index('ROMA')])
+    # NAZIONALE and BARI draw fewer times than the other wheels.
+    assert index.scores[:, presence.wheels.index('NAZIONALE')].sum() < index.scores[:, presence.wheels.index('ROMA')].sum()
+
+
+def test_saved_scores_extend_with_newer_draws(presence, tmp_path):
+    path = str(tmp_path / 'heat.npz')
+    older = Presence(presence.records[:70])
+    index = HeatIndex(older, half_lives=(3, 10))
+    index.extend()
+    index.save(path)
+
+    loaded = HeatIndex.load(path, presence)
+    assert loaded.digest == older.prefix_digest(70)
+    assert loaded.extend() == len(presence) - 70
+    assert loaded.extend() == 0
+    assert np.allclose(loaded.scores, direct_scores(presence, (3, 10)))
+
+
+def test_saved_scores_of_other_draws_are_rebuilt(presence, tmp_path):
+    # Same dates and last date, one draw different: the saved scores no
+    # longer describe this presence.
+    data_dir = str(tmp_path)
+    ensure_dirs(data_dir)
+    load_heat(presence, data_dir)
+    records = np.array(presence.records)
+    records['flags'][10] = records['flags'][10, :, ::-1]
+    changed = Presence(records)
+    assert np.allclose(load_heat(changed, data_dir).scores, direct_scores(changed, HALF_LIVES))
@@ -0,0 +1,81 @@
+import importlib
+import json
+import os
+
+import numpy as np
+import pytest
+
+from lotto.dataset import WHEELS
+from lotto.download import Downloader
+from lotto.history import PartitionedHistory
+from lotto.refresh import refresh
+from lotto.workspace import ensure_dirs
+
+# The module, not the function the package exports under the same name.
+refresh_module = importlib.import_module('lotto.refresh')
+
+OLD_DATES = 2000
+
+
+def no_sleep(seconds):
+    pass
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    path = str(tmp_path / 'data')
+    ensure_dirs(path)
+    return path
+
+
+def history_records(data_dir):
+    return np.asarray(PartitionedHistory.open(data_dir).records())
+
+
+def test_conditional_refresh(make_archive, serve, data_dir, tmp_path):
+    old_server, old_url = serve(make_archive('old.zip', OLD_DATES))
+    assert refresh(old_url, data_dir, downloader=Downloader(sleep=no_sleep)) == OLD_DATES * len(WHEELS)
+    assert len(history_records(data_dir)) == OLD_DATES * len(WHEELS)
+
+    # Unchanged upstream: a 304, and nothing else is touched.
+    version = PartitionedHistory.open(data_dir).version
+    assert refresh(old_url, data_dir) == 0
+    assert old_server.requests[-1].get('If-None-Match')
+    assert PartitionedHistory.open(data_dir).version == version
+
+    # New draws upstream: only they are appended, and the history matches
+    # one built from scratch.
+    new_archive = make_archive('new.zip')
+    new_server, new_url = serve(new_archive)
+    added = refresh(new_url, data_dir)
+    rebuilt_dir = str(tmp_path / 'rebuilt')
+    ensure_dirs(rebuilt_dir)
+    total = refresh(new_url, rebuilt_dir)
+    assert added == total - OLD_DATES * len(WHEELS) > 0
+    assert np.array_equal(history_records(data_dir), history_records(rebuilt_dir))
+    assert PartitionedHistory.open(data_dir).version == PartitionedHistory.open(rebuilt_dir).version
+
+
+def test_failed_refresh_is_retried(make_archive, serve, data_dir, archive_lines, monkeypatch):
+    old_server, old_url = serve(make_archive('old.zip', OLD_DATES))
+    refresh(old_url, data_dir)
+    with open(os.path.join(data_dir, 'raw', 'lotto_historical.json')) as f:
+        old_etag = json.load(f)['etag']
+    new_server, new_url = serve(make_archive('new.zip'))
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("stats failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(refresh_module, 'frequency_tables', fail)
+        with pytest.raises(RuntimeError, match='stats failed'):
+            refresh(new_url, data_dir)
+    assert len(history_records(data_dir)) == OLD_DATES * len(WHEELS)
+
+    # The new archive is on disk, but its validators were not saved without
+    # a history built from it: the retry still sends the old ones, gets the
+    # archive again and ingests it.
+    assert refresh(new_url, data_dir) == len(archive_lines) - OLD_DATES * len(WHEELS)
+    assert new_server.requests[1].get('If-None-Match') == old_etag
+    assert len(history_records(data_dir)) == len(archive_lines)
+    assert refresh(new_url, data_dir) == 0
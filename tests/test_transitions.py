@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from lotto import transitions
+from lotto.transitions import TransitionIndex
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # Several blocks even over a short history.
+    monkeypatch.setattr(transitions, 'BLOCK_DATES', 16)
+
+
+def followed(presence, t, k, exact):
+    # Flat (wheel * 90 + number - 1) positions drawn exactly k dates after
+    # t, or at least once within the k dates after it.
+    flat = presence.matrix.reshape(len(presence), -1)
+    later = flat[t + k] if exact else flat[t + 1:t + k + 1].any(axis=0)
+    return np.flatnonzero(later)
+
+
+def direct_counts(presence, k, exact):
+    size = len(presence.wheels) * 90
+    counts = np.zeros((size, size), dtype=np.int64)
+    flat = presence.matrix.reshape(len(presence), -1)
+    for t in range(len(presence) - k):
+        targets = followed(presence, t, k, exact)
+        for source in np.flatnonzero(flat[t]):
+            counts[source, targets] += 1
+    return counts
+
+
+@pytest.mark.parametrize('lag', [1, 2, 5])
+def test_lag_counts_match_a_direct_loop(presence, lag):
+    assert np.array_equal(TransitionIndex(presence).lag(lag), direct_counts(presence, lag, exact=True))
+
+
+@pytest.mark.parametrize('k', [1, 3, 12])
+def test_window_counts_match_a_direct_loop(presence, k):
+    assert np.array_equal(TransitionIndex(presence).within(k), direct_counts(presence, k, exact=False))
+
+
+def test_matrices_are_kept_per_lag(presence):
+    index = TransitionIndex(presence)
+    assert index.lag(2) is index.lag(2)
+    assert index.within(3) is index.within(3)
+
+
+@pytest.mark.parametrize('exact', [False, True])
+@pytest.mark.parametrize('wheel, number, target_wheel', [('BARI', 17, None), ('ROMA', 5, 'NAZIONALE')])
+def test_followers_match_a_direct_loop(presence, wheel, number, target_wheel, exact):
+    k = 3
+    source = presence.wheels.index(wheel)
+    target = presence.wheels.index(target_wheel or wheel)
+    counts = np.zeros(90, dtype=np.int64)
+    base = np.zeros(90, dtype=np.int64)
+    occurrences = draws = 0
+    for t in range(len(presence) - k):
+        if not presence.drawn[t, source]:
+            continue
+        hits = followed(presence, t, k, exact)
+        hits = hits[(hits >= target * 90) & (hits < target * 90 + 90)] - target * 90
+        draws += 1
+        base[hits] += 1
+        if presence.matrix[t, source, number - 1]:
+            occurrences += 1
+            counts[hits] += 1
+
+    table = TransitionIndex(presence).followers(wheel, number, k, target_wheel, top=90, exact=exact)
+    table = table.sort_values('number').reset_index(drop=True)
+    assert table.attrs['occurrences'] == occurrences
+    assert np.array_equal(table['count'], counts)
+    assert np.allclose(table['rate'], counts / occurrences)
+    assert np.allclose(table['base_rate'], base / draws)
+
+
+def test_followers_are_ranked_by_count(presence):
+    table = TransitionIndex(presence).followers('MILANO', 40, k=4, top=5)
+    assert len(table) == 5
+    assert (np.diff(table['count']) <= 0).all()